@@ -1,16 +1,28 @@
 # faq_agent_crewai.py
 
 import os
+import re
+import time
+import unicodedata
+import queue
+import atexit
+import threading
+import hashlib
+import functools
 import sqlite3
 import logging
-import json
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Iterator
 from dotenv import load_dotenv
 
+import numpy as np
+import orjson
+import faiss
 import streamlit as st
+from sentence_transformers import SentenceTransformer
 
 from crewai import Agent, Task, Crew, Process, LLM
 from crewai.tools import tool
+from crewai.types.streaming import StreamChunkType
 
 # --------------- Setup Logging ---------------
 LOG_DIR = os.path.join(os.path.dirname(__file__), "logs")
@@ -33,30 +45,161 @@ AZURE_MODEL = os.getenv("AZURE_OPENAI_MODEL_NAME")
 DB_PATH = os.path.join(os.path.dirname(__file__), "faq.db")
 
 
+@st.cache_resource
+def _open_db():
+    """One autocommit WAL connection per process, shared across reruns and sessions."""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-20000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn, threading.Lock()
+
+
+_CONN, _LOCK = _open_db()
+
+
+# --------------- FAQ Lookup ---------------
+# Filler words that would otherwise prefix-match every FAQ
+FTS_STOPWORDS = set(
+    "a an and are can do does for how i in is it me of on or the to what when "
+    "where which who why with you".split()
+)
+
+
+def build_match_query(question: str) -> str:
+    """Turn free text into an FTS5 prefix query over the question column that
+    requires every remaining word, e.g. 'Is LangGraph free?' ->
+    'question : ("langgraph"* "free"*)'. A question merely mentioning a topic
+    must not be answered with that topic's FAQ (a hit skips the writer)."""
+    tokens = [t for t in re.findall(r"\w+", question.lower()) if t not in FTS_STOPWORDS]
+    if not tokens:
+        return ""
+    return "question : (" + " ".join(f'"{t}"*' for t in tokens) + ")"
+
+
+@functools.lru_cache(maxsize=512)
+def _search_faq_impl(question_norm: str) -> str:
+    match = build_match_query(question_norm)
+    with _LOCK:
+        # Literal repeats of a stored question (with or without its "?") hit the
+        # NOCASE index; FTS only on a miss
+        bare = question_norm.rstrip(" ?")
+        row = _CONN.execute(
+            "SELECT answer FROM faqs WHERE question COLLATE NOCASE IN (?, ?) LIMIT 1",
+            (bare, bare + "?"),
+        ).fetchone()
+        if row is None and match:
+            # BM25 on the question column only (answer weight 0)
+            row = _CONN.execute(
+                "SELECT answer FROM faqs_fts WHERE faqs_fts MATCH ? "
+                "ORDER BY bm25(faqs_fts, 1.0, 0.0) LIMIT 1",
+                (match,),
+            ).fetchone()
+    if row:
+        logging.info(f"FAQ match found for '{question_norm}'.")
+        return orjson.dumps({"found": True, "answer": row[0]}).decode()
+    logging.info(f"No FAQ match found for '{question_norm}'.")
+    return orjson.dumps({"found": False, "answer": None}).decode()
+
+
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
+    with _LOCK:
+        cur = _CONN.cursor()
+        fts_exists = cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='faqs_fts'"
+        ).fetchone()
+        unique_exists = cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='index' AND name='idx_faqs_question'"
+        ).fetchone()
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS faqs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                question TEXT,
+                answer TEXT
+            )
         """
-        CREATE TABLE IF NOT EXISTS faqs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            question TEXT,
-            answer TEXT
         )
-    """
-    )
-    cur.execute(
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS feedback (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                question TEXT,
+                answer TEXT,
+                feedback TEXT
+            )
         """
-        CREATE TABLE IF NOT EXISTS feedback (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            question TEXT,
-            answer TEXT,
-            feedback TEXT
         )
-    """
-    )
-    conn.commit()
-    conn.close()
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                answer TEXT,
+                created_at INTEGER
+            )
+        """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sem_cache (
+                id INTEGER PRIMARY KEY,
+                embedding BLOB,
+                question TEXT,
+                answer TEXT
+            )
+        """
+        )
+        if not unique_exists:
+            # Databases from before the unique index may repeat a question (e.g. from
+            # re-seeding); keep the first copy so the index can be created
+            removed = cur.execute(
+                "DELETE FROM faqs WHERE id NOT IN "
+                "(SELECT MIN(id) FROM faqs GROUP BY question)"
+            ).rowcount
+            if removed:
+                logging.info(f"Removed {removed} duplicate FAQ row(s).")
+                _search_faq_impl.cache_clear()
+            cur.execute("CREATE UNIQUE INDEX idx_faqs_question ON faqs(question)")
+        # Case-insensitive index backing the exact-match fast path in search_faq
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_faqs_question_nocase "
+            "ON faqs(question COLLATE NOCASE)"
+        )
+        # FTS5 index over the FAQs (external-content table kept in sync by triggers)
+        cur.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS faqs_fts USING fts5(
+                question,
+                answer,
+                tokenize='unicode61 remove_diacritics 2',
+                content='faqs',
+                content_rowid='id',
+                prefix='2 3 4'
+            )
+        """
+        )
+        cur.executescript(
+            """
+            CREATE TRIGGER IF NOT EXISTS faqs_ai AFTER INSERT ON faqs BEGIN
+                INSERT INTO faqs_fts(rowid, question, answer)
+                VALUES (new.id, new.question, new.answer);
+            END;
+            CREATE TRIGGER IF NOT EXISTS faqs_ad AFTER DELETE ON faqs BEGIN
+                INSERT INTO faqs_fts(faqs_fts, rowid, question, answer)
+                VALUES ('delete', old.id, old.question, old.answer);
+            END;
+            CREATE TRIGGER IF NOT EXISTS faqs_au AFTER UPDATE ON faqs BEGIN
+                INSERT INTO faqs_fts(faqs_fts, rowid, question, answer)
+                VALUES ('delete', old.id, old.question, old.answer);
+                INSERT INTO faqs_fts(rowid, question, answer)
+                VALUES (new.id, new.question, new.answer);
+            END;
+        """
+        )
+        if not fts_exists:
+            # Index any FAQ rows that predate the FTS table
+            cur.execute("INSERT INTO faqs_fts(faqs_fts) VALUES ('rebuild')")
 
 
 init_db()
@@ -87,21 +230,96 @@ SAMPLE_FAQS = [
 
 
 def seed_faqs():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    for q, a in SAMPLE_FAQS:
-        cur.execute("INSERT INTO faqs (question, answer) VALUES (?, ?)", (q, a))
-    conn.commit()
-    conn.close()
+    with _LOCK:
+        # Runs on every rerun: a read-only check unless the table is still empty
+        if _CONN.execute("SELECT 1 FROM faqs LIMIT 1").fetchone():
+            return
+        # One transaction (and one WAL commit) for the whole batch
+        _CONN.execute("BEGIN")
+        try:
+            cur = _CONN.executemany(
+                "INSERT OR IGNORE INTO faqs (question, answer) VALUES (?, ?)",
+                SAMPLE_FAQS,
+            )
+            _CONN.execute("COMMIT")
+        except Exception:
+            _CONN.execute("ROLLBACK")
+            raise
+    if cur.rowcount:
+        logging.info("Seeded sample FAQ data.")
+        _search_faq_impl.cache_clear()  # drop any "not found" results
 
 
-# Only seed if no data
-conn = sqlite3.connect(DB_PATH)
-count = conn.execute("SELECT COUNT(*) FROM faqs").fetchone()[0]
-conn.close()
-if count == 0:
-    seed_faqs()
-    logging.info("Seeded sample FAQ data.")
+seed_faqs()
+
+# --------------- Feedback Writer ---------------
+FEEDBACK_BATCH_SIZE = 100
+FEEDBACK_FLUSH_SECS = 2.0
+
+
+def _write_feedback(batch):
+    with _LOCK:
+        _CONN.execute("BEGIN")
+        try:
+            _CONN.executemany(
+                "INSERT INTO feedback (question, answer, feedback) VALUES (?, ?, ?)",
+                batch,
+            )
+            _CONN.execute("COMMIT")
+        except Exception:
+            _CONN.execute("ROLLBACK")
+            raise
+    logging.info(f"Stored {len(batch)} feedback row(s).")
+
+
+_FEEDBACK_STOP = object()  # queued by the exit hook to end the writer
+
+
+def _drain_feedback(q: queue.Queue, status: Dict[str, str]):
+    """Collect up to FEEDBACK_BATCH_SIZE rows (or FEEDBACK_FLUSH_SECS) per transaction."""
+    stop = False
+    while not stop:
+        batch = [q.get()]
+        deadline = time.monotonic() + FEEDBACK_FLUSH_SECS
+        while len(batch) < FEEDBACK_BATCH_SIZE and batch[-1] is not _FEEDBACK_STOP:
+            try:
+                batch.append(q.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        if batch[-1] is _FEEDBACK_STOP:
+            batch.pop()
+            stop = True
+        if not batch:
+            continue
+        try:
+            _write_feedback(batch)
+            status.pop("error", None)
+        except Exception as e:
+            # Kept for the UI, which reports it on the next feedback submit
+            status["error"] = str(e)
+            logging.exception(f"Failed to store {len(batch)} feedback row(s): {e}")
+
+
+def _stop_feedback_writer(q: queue.Queue, writer: threading.Thread):
+    """Let the writer finish the batch it holds plus anything still queued."""
+    q.put(_FEEDBACK_STOP)
+    writer.join(timeout=FEEDBACK_FLUSH_SECS + 10)
+
+
+@st.cache_resource
+def _feedback_queue():
+    """One background writer per process; the UI only enqueues feedback rows."""
+    q = queue.Queue()
+    status: Dict[str, str] = {}
+    writer = threading.Thread(
+        target=_drain_feedback, args=(q, status), name="feedback-writer", daemon=True
+    )
+    writer.start()
+    atexit.register(_stop_feedback_writer, q, writer)
+    return q, status
+
+
+_FB_Q, _FB_STATUS = _feedback_queue()
 
 
 # --------------- FAQ Search Tool ---------------
@@ -110,80 +328,249 @@ def search_faq(question: str) -> str:
     """
     Look up the FAQ database for a question. Return a JSON string:
     {"found": true/false, "answer": "<answer or null>"}.
-    Uses simple LIKE matching for demo purposes.
+    Tries an exact (case-insensitive) question match first, then SQLite FTS5
+    full-text matching ranked by BM25.
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        cur.execute("SELECT answer FROM faqs WHERE question LIKE ?", (f"%{question}%",))
-        row = cur.fetchone()
-        conn.close()
-        if row:
-            logging.info(f"FAQ match found for '{question}'.")
-            return json.dumps({"found": True, "answer": row[0]})
-        logging.info(f"No FAQ match found for '{question}'.")
-        return json.dumps({"found": False, "answer": None})
+        # Repeated lookups (agent retries/reflection) are served from the LRU
+        return _search_faq_impl(" ".join(question.lower().split()))
     except Exception as e:
         logging.exception(f"search_faq error: {e}")
-        return json.dumps({"found": False, "answer": None, "error": str(e)})
+        return orjson.dumps({"found": False, "answer": None, "error": str(e)}).decode()
 
 
-# --------------- CrewAI LLM (Azure) ---------------
-crew_llm = LLM(
-    model=f"azure/{AZURE_MODEL}",
-    api_key=AZURE_API_KEY,
-    api_base=AZURE_ENDPOINT,
-    api_version=AZURE_API_VERSION,
-)
+# --------------- LLM Response Cache ---------------
+LLM_CACHE_TTL = 24 * 60 * 60  # seconds
 
-# --------------- Agents ---------------
-retriever_agent = Agent(
-    role="FAQ Retriever",
-    goal="Find accurate answers from the local FAQ database using provided tools.",
-    backstory="You quickly check a local FAQ list to see if the user's question already has a vetted answer.",
-    tools=[search_faq],
-    llm=crew_llm,
-    allow_delegation=False,
-    verbose=False,
-)
 
-writer_agent = Agent(
-    role="Answer Writer",
-    goal="When no exact FAQ is found, write a concise and helpful answer to the user's question.",
-    backstory="You craft clear, friendly responses drawing on your general knowledge.",
-    llm=crew_llm,
-    allow_delegation=False,
-    verbose=False,
-)
+def normalize(text: str) -> str:
+    """Canonical form for cache keys and embeddings: NFKC, lowercase, single spaces, no edge ?.!"""
+    text = " ".join(unicodedata.normalize("NFKC", text).lower().split())
+    return text.strip(" ?.!")
 
-# --------------- Tasks ---------------
-search_task = Task(
-    description=(
-        "Use the search_faq tool to find an answer for the user's question: '{question}'. "
-        "Return ONLY JSON with keys: found (true/false) and answer (string or null)."
-    ),
-    expected_output='JSON: {"found": <bool>, "answer": <string-or-null>}',
-    agent=retriever_agent,
-    tools=[search_faq],
-)
 
-fallback_task = Task(
-    description=(
-        "You receive the prior task output as context. If it indicates found=true, simply return that answer verbatim. "
-        "If found=false, write a concise, friendly answer to the original question: '{question}'. "
-        "Return ONLY the final answer text."
-    ),
-    expected_output="Final answer text only.",
-    agent=writer_agent,
-)
+def cache_key(question: str) -> str:
+    raw = f"{AZURE_MODEL}|{AZURE_API_VERSION}|{normalize(question)}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def get_cached_answer(key: str):
+    with _LOCK:
+        row = _CONN.execute(
+            "SELECT answer FROM llm_cache WHERE key = ? AND created_at > ?",
+            (key, int(time.time()) - LLM_CACHE_TTL),
+        ).fetchone()
+    return row[0] if row else None
+
+
+def put_cached_answer(key: str, answer: str):
+    with _LOCK:
+        _CONN.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, answer, created_at) VALUES (?, ?, ?)",
+            (key, answer, int(time.time())),
+        )
+
+
+# --------------- Semantic Cache ---------------
+SEM_INDEX_PATH = os.path.join(os.path.dirname(__file__), "sem_cache.faiss")
+SEM_CACHE_THRESHOLD = 0.92  # cosine similarity
+EMBED_MODEL = "all-MiniLM-L6-v2"
+EMBED_DIM = 384
+
+
+@st.cache_resource
+def get_encoder() -> SentenceTransformer:
+    return SentenceTransformer(EMBED_MODEL)
+
+
+def _build_sem_index() -> faiss.Index:
+    index = faiss.IndexIDMap(faiss.IndexFlatIP(EMBED_DIM))
+    with _LOCK:
+        rows = _CONN.execute("SELECT id, embedding FROM sem_cache").fetchall()
+    if rows:
+        ids = np.array([r[0] for r in rows], dtype="int64")
+        vecs = np.vstack([np.frombuffer(r[1], dtype="float32") for r in rows])
+        index.add_with_ids(vecs, ids)
+    return index
+
+
+@st.cache_resource
+def get_sem_index():
+    """Load the persisted FAISS index (rebuilt from sem_cache if missing or stale)."""
+    with _LOCK:
+        count = _CONN.execute("SELECT COUNT(*) FROM sem_cache").fetchone()[0]
+    index = None
+    if os.path.exists(SEM_INDEX_PATH):
+        index = faiss.read_index(SEM_INDEX_PATH)
+        if index.ntotal != count:
+            index = None
+    if index is None:
+        index = _build_sem_index()
+    atexit.register(faiss.write_index, index, SEM_INDEX_PATH)
+    return index, threading.Lock()
+
+
+def embed(text: str) -> np.ndarray:
+    vec = get_encoder().encode(normalize(text), normalize_embeddings=True)
+    return vec.astype("float32")
+
+
+def sem_lookup(vec: np.ndarray):
+    index, lock = get_sem_index()
+    with lock:
+        if index.ntotal == 0:
+            return None
+        scores, ids = index.search(vec[None, :], 1)
+    if scores[0, 0] < SEM_CACHE_THRESHOLD:
+        return None
+    with _LOCK:
+        row = _CONN.execute(
+            "SELECT answer FROM sem_cache WHERE id = ?", (int(ids[0, 0]),)
+        ).fetchone()
+    return row[0] if row else None
+
+
+def sem_store(vec: np.ndarray, question: str, answer: str):
+    with _LOCK:
+        cur = _CONN.execute(
+            "INSERT INTO sem_cache (embedding, question, answer) VALUES (?, ?, ?)",
+            (vec.tobytes(), question, answer),
+        )
+    index, lock = get_sem_index()
+    with lock:
+        index.add_with_ids(vec[None, :], np.array([cur.lastrowid], dtype="int64"))
+
+
+def sem_replace(vec: np.ndarray, question: str, answer: str):
+    """Point the entry this question resolves to at a new answer (insert if none)."""
+    index, lock = get_sem_index()
+    with lock:
+        hit = None
+        if index.ntotal:
+            scores, ids = index.search(vec[None, :], 1)
+            if scores[0, 0] >= SEM_CACHE_THRESHOLD:
+                hit = int(ids[0, 0])
+    if hit is None:
+        sem_store(vec, question, answer)
+        return
+    # The embedding is unchanged, so only the stored answer needs rewriting
+    with _LOCK:
+        _CONN.execute("UPDATE sem_cache SET answer = ? WHERE id = ?", (answer, hit))
+
+
+def parse_search_output(raw: str) -> Dict[str, Any]:
+    """Parse the search_task JSON, tolerating a markdown code fence around it."""
+    text = raw.strip().removeprefix("```json").removeprefix("```").removesuffix("```")
+    try:
+        parsed = orjson.loads(text.strip())
+    except Exception:
+        return {"found": False, "answer": None}
+    return parsed if isinstance(parsed, dict) else {"found": False, "answer": None}
+
+
+def stream_text(streaming: Iterable, agent: Agent) -> Iterator[str]:
+    """Yield the text tokens produced by the given agent during a streamed kickoff.
+
+    CrewAI's stream handler listens on the process-wide event bus, so the stream
+    also carries other sessions' chunks; the per-run agent id tells them apart
+    (roles are the same in every session).
+    """
+    agent_id = str(agent.id)
+    for chunk in streaming:
+        if chunk.chunk_type == StreamChunkType.TEXT and chunk.agent_id == agent_id:
+            yield chunk.content
+
+
+# --------------- Agents, Tasks & Crew ---------------
+# Output caps: answers are a few sentences, so bound output tokens (billing and
+# latency) and, as a last guard, the characters rendered in the UI.
+WRITER_MAX_TOKENS = 350
+MAX_ANSWER_CHARS = 2000
+
+
+# The LLM clients are built once per process rather than on every Streamlit rerun
+@st.cache_resource
+def get_llms():
+    # LLM (Azure)
+    azure = dict(
+        model=f"azure/{AZURE_MODEL}",
+        api_key=AZURE_API_KEY,
+        api_base=AZURE_ENDPOINT,
+        api_version=AZURE_API_VERSION,
+    )
+    crew_llm = LLM(**azure)
+    # The writer only runs in streamed crews; say so here rather than leave it to
+    # kickoff(), which flips stream on the (shared) LLM of every agent it runs
+    writer_llm = LLM(**azure, max_tokens=WRITER_MAX_TOKENS, stream=True)
+    return crew_llm, writer_llm
+
+
+def build_writer_agent() -> Agent:
+    return Agent(
+        role="Answer Writer",
+        goal="When no exact FAQ is found, write a concise and helpful answer to the user's question.",
+        backstory="You craft clear, friendly responses drawing on your general knowledge.",
+        llm=get_llms()[1],
+        allow_delegation=False,
+        verbose=False,
+    )
+
+
+# Agents, tasks and crews are built per query: kickoff(inputs=...) interpolates
+# '{question}' into the Task descriptions and stores outputs on them, so a shared
+# crew would let concurrent sessions overwrite each other's question.
+def build_faq_crews():
+    crew_llm, _ = get_llms()
+
+    # Agents
+    retriever_agent = Agent(
+        role="FAQ Retriever",
+        goal="Find accurate answers from the local FAQ database using provided tools.",
+        backstory="You quickly check a local FAQ list to see if the user's question already has a vetted answer.",
+        tools=[search_faq],
+        llm=crew_llm,
+        allow_delegation=False,
+        verbose=False,
+    )
+    writer_agent = build_writer_agent()
+
+    # Tasks
+    search_task = Task(
+        description=(
+            "Use the search_faq tool to find an answer for the user's question: '{question}'. "
+            "Return ONLY JSON with keys: found (true/false) and answer (string or null)."
+        ),
+        expected_output='JSON: {"found": <bool>, "answer": <string-or-null>}',
+        agent=retriever_agent,
+        tools=[search_faq],
+    )
+
+    fallback_task = Task(
+        description=(
+            "No vetted FAQ answer exists for this question. "
+            "Write a concise, friendly answer to the question: '{question}'. "
+            "Return ONLY the final answer text."
+        ),
+        expected_output="Final answer text only.",
+        agent=writer_agent,
+    )
+
+    # Crews: search first; the writer only runs when the FAQ table has no answer
+    search_crew = Crew(
+        agents=[retriever_agent],
+        tasks=[search_task],
+        process=Process.sequential,
+        verbose=False,
+    )
+    answer_crew = Crew(
+        agents=[writer_agent],
+        tasks=[fallback_task],
+        process=Process.sequential,
+        verbose=False,
+        stream=True,  # kickoff() yields token chunks; the CrewOutput is on .result
+    )
+    return search_crew, answer_crew, writer_agent
 
-# --------------- Crew ---------------
-crew = Crew(
-    agents=[retriever_agent, writer_agent],
-    tasks=[search_task, fallback_task],
-    process=Process.sequential,  # Search first, then fallback writer
-    verbose=False,
-)
 
 # --------------- Streamlit UI ---------------
 st.set_page_config(page_title="CrewAI FAQ Bot", layout="wide")
@@ -201,45 +588,71 @@ if st.button("Submit Query"):
         st.warning("Please enter a question.")
     else:
         try:
-            # Step 1: Kick off crew with question input
-            result_text = crew.kickoff(inputs={"question": query})
-            # CrewOutput object: extract answer from its attributes if needed
-            if hasattr(result_text, "output"):
-                final_answer = str(result_text.output).strip()
-            else:
-                final_answer = str(result_text).strip()
-
-            # Step record: we also log what search_faq returned for transparency
-            # (Run tool directly to capture structured step info, mirroring LangGraph steps log)
-            raw = search_faq.run(query)  # tool returns string
-            try:
-                parsed = json.loads(raw)
-            except Exception:
-                parsed = {"found": False, "answer": None}
-
-            if parsed.get("found"):
-                st.session_state.steps.append(
-                    {"step": "search_faq", "result": f"FAQ match found for '{query}'."}
-                )
-            else:
-                st.session_state.steps.append(
-                    {
-                        "step": "search_faq",
-                        "result": f"No FAQ match found for '{query}'.",
-                    }
-                )
+            key = cache_key(query)
+            cached = get_cached_answer(key)
+            cache_step = "llm_cache"
+            if cached is None:
+                query_vec = embed(query)
+                cached = sem_lookup(query_vec)
+                cache_step = "semantic_cache"
+            if cached is not None:
+                logging.info(f"{cache_step} hit for '{query}'.")
                 st.session_state.steps.append(
                     {
-                        "step": "generate_answer",
-                        "result": "Generated fallback answer via LLM.",
+                        "step": cache_step,
+                        "result": f"Served cached answer for '{query}'.",
                     }
                 )
+                st.session_state.result = {
+                    "question": query,
+                    "answer": cached,
+                    "persist_feedback": True,
+                }
+            else:
+                search_crew, answer_crew, writer_agent = build_faq_crews()
+                # Step 1: Retriever only; its JSON says whether a vetted FAQ answer exists
+                search_result = search_crew.kickoff(inputs={"question": query})
+                parsed = parse_search_output(search_result.raw)
+
+                if parsed.get("found") and parsed.get("answer"):
+                    # FAQ hit: return the stored answer directly, no writer LLM call
+                    final_answer = str(parsed["answer"]).strip()
+                    st.session_state.steps.append(
+                        {
+                            "step": "search_faq",
+                            "result": f"FAQ match found for '{query}'.",
+                        }
+                    )
+                else:
+                    # Step 2: Writer fallback, showing its tokens live; the
+                    # placeholder is cleared once the answer is final
+                    streaming = answer_crew.kickoff(inputs={"question": query})
+                    live = st.empty()
+                    live.write_stream(stream_text(streaming, writer_agent))
+                    live.empty()
+                    final_answer = streaming.result.raw.strip()
+                    st.session_state.steps.append(
+                        {
+                            "step": "search_faq",
+                            "result": f"No FAQ match found for '{query}'.",
+                        }
+                    )
+                    st.session_state.steps.append(
+                        {
+                            "step": "generate_answer",
+                            "result": "Generated fallback answer via LLM.",
+                        }
+                    )
 
-            st.session_state.result = {
-                "question": query,
-                "answer": final_answer if final_answer else parsed.get("answer") or "",
-                "persist_feedback": True,
-            }
+                st.session_state.result = {
+                    "question": query,
+                    "answer": final_answer[:MAX_ANSWER_CHARS],
+                    "persist_feedback": True,
+                }
+                answer = st.session_state.result["answer"]
+                if answer:
+                    put_cached_answer(key, answer)
+                    sem_store(query_vec, query, answer)
         except Exception as e:
             logging.exception(e)
             st.session_state.result = {"error": str(e)}
@@ -262,26 +675,21 @@ if st.session_state.result:
         if st.button("Submit Feedback", key="fb_btn"):
             result["feedback"] = feedback
             if result.get("persist_feedback"):
-                # Perform DB write here (same as LangGraph version)
-                try:
-                    conn = sqlite3.connect(DB_PATH)
-                    cur = conn.cursor()
-                    cur.execute(
-                        "INSERT INTO feedback (question, answer, feedback) VALUES (?, ?, ?)",
-                        (
-                            result.get("question"),
-                            result.get("answer"),
-                            result.get("feedback"),
-                        ),
+                # Hand the row to the background writer; the insert is batched off the UI thread
+                _FB_Q.put(
+                    (
+                        result.get("question"),
+                        result.get("answer"),
+                        result.get("feedback"),
                     )
-                    conn.commit()
-                    conn.close()
-                    logging.info("Feedback stored (from UI).")
-                except Exception as e:
-                    st.error(f"Feedback DB error: {e}")
+                )
+                logging.info("Feedback queued (from UI).")
+                if _FB_STATUS.get("error"):
+                    st.error(f"Feedback DB error: {_FB_STATUS['error']}")
             if feedback == "No":
                 # Lightweight regeneration path (call writer agent alone)
                 try:
+                    writer_agent = build_writer_agent()
                     regen_task = Task(
                         description=(
                             f"The previous answer wasn't helpful. Rewrite a clearer, more concise answer to: '{result.get('question')}'. "
@@ -295,9 +703,21 @@ if st.session_state.result:
                         tasks=[regen_task],
                         process=Process.sequential,
                         verbose=False,
+                        stream=True,
+                    )
+                    streaming = regen_crew.kickoff()
+                    live = st.empty()
+                    live.write_stream(stream_text(streaming, writer_agent))
+                    better = streaming.result.raw[:MAX_ANSWER_CHARS]
+                    # Replace the unhelpful cached answer with the regenerated one,
+                    # in the exact-match cache and for paraphrases in the semantic one
+                    put_cached_answer(cache_key(result.get("question")), str(better))
+                    sem_replace(
+                        embed(result.get("question")),
+                        result.get("question"),
+                        str(better),
                     )
-                    better = regen_crew.kickoff()
-                    st.markdown(f"**LLM Answer:** {better}")
+                    live.markdown(f"**LLM Answer:** {better}")
                 except Exception as e:
                     st.error(f"Regeneration error: {e}")
             else:
@@ -0,0 +1,98 @@
+import sqlite3
+
+import orjson
+import pytest
+
+import app
+
+LANGCHAIN = app.SAMPLE_FAQS[0][1]
+LANGGRAPH_FREE = app.SAMPLE_FAQS[4][1]
+
+
+def connect(path) -> sqlite3.Connection:
+    return sqlite3.connect(path, isolation_level=None)
+
+
+@pytest.fixture
+def faq_db(tmp_path, monkeypatch):
+    """Point the app at an empty database instead of its faq.db."""
+    conn = connect(tmp_path / "faq.db")
+    monkeypatch.setattr(app, "_CONN", conn)
+    app._search_faq_impl.cache_clear()
+    yield conn
+    app._search_faq_impl.cache_clear()
+    conn.close()
+
+
+@pytest.fixture
+def seeded(faq_db):
+    app.init_db()
+    app.seed_faqs()
+    return faq_db
+
+
+def search(question: str) -> dict:
+    return orjson.loads(app.search_faq.run(question=question))
+
+
+def test_build_match_query_drops_stopwords_and_requires_every_word():
+    assert (
+        app.build_match_query("Is LangGraph free?")
+        == 'question : ("langgraph"* "free"*)'
+    )
+
+
+def test_build_match_query_only_stopwords():
+    assert app.build_match_query("What is it?") == ""
+
+
+def test_build_match_query_strips_fts_syntax():
+    assert app.build_match_query('"NEAR" (OR) *') == 'question : ("near"*)'
+
+
+@pytest.mark.parametrize(
+    "question, answer",
+    [
+        ("What is LangChain?", LANGCHAIN),
+        ("what is langchain", LANGCHAIN),
+        ("  WHAT IS   LANGCHAIN?  ", LANGCHAIN),
+        ("is langgraph free", LANGGRAPH_FREE),
+        ("Is LangGraph free to use for startups?", None),
+    ],
+)
+def test_search_faq(seeded, question, answer):
+    res = search(question)
+    assert res == {"found": answer is not None, "answer": answer}
+
+
+def test_search_faq_topic_mention_is_not_a_hit(seeded):
+    # Would match a LangGraph FAQ on "langgraph" alone if any word sufficed
+    assert search("How do I deploy LangGraph on Kubernetes?")["found"] is False
+
+
+def test_search_faq_only_stopwords_misses(seeded):
+    assert search("what is it?")["found"] is False
+
+
+def test_seed_faqs_runs_once(seeded):
+    app.seed_faqs()
+    count = seeded.execute("SELECT COUNT(*) FROM faqs").fetchone()[0]
+    assert count == len(app.SAMPLE_FAQS)
+
+
+def test_init_db_dedupes_questions_before_adding_unique_index(faq_db):
+    faq_db.execute(
+        "CREATE TABLE faqs (id INTEGER PRIMARY KEY, question TEXT, answer TEXT)"
+    )
+    faq_db.executemany(
+        "INSERT INTO faqs (question, answer) VALUES (?, ?)",
+        [("What is LangChain?", "first"), ("What is LangChain?", "second")],
+    )
+    app.init_db()
+    rows = faq_db.execute("SELECT question, answer FROM faqs").fetchall()
+    assert rows == [("What is LangChain?", "first")]
+    with pytest.raises(sqlite3.IntegrityError):
+        faq_db.execute(
+            "INSERT INTO faqs (question, answer) VALUES ('What is LangChain?', 'x')"
+        )
+    assert search("What is LangChain?") == {"found": True, "answer": "first"}
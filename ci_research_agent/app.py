@@ -1,17 +1,29 @@
 # researcher_writer_editor_crewai.py
 
 import os
-import json
+import asyncio
+import time
+import unicodedata
+import atexit
+import threading
+import hashlib
+import sqlite3
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+import numpy as np
+import orjson
+import faiss
 import streamlit as st
+from sentence_transformers import SentenceTransformer
 
 from crewai import Agent, Task, Crew, Process, LLM
 from crewai.tools import tool
+from crewai.types.streaming import StreamChunkType
 
-from ddgs import DDGS
+from search_clients import ddgs_client
 
 # ----------------------- Logging -----------------------
 LOG_DIR = os.path.join(os.path.dirname(__file__), "logs")
@@ -30,7 +42,225 @@ AZURE_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 AZURE_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-12-01-preview")
 AZURE_MODEL = os.getenv("AZURE_OPENAI_MODEL_NAME")
 
+# ----------------------- Cache DB -----------------------
+DB_PATH = os.path.join(os.path.dirname(__file__), "research_cache.db")
+LLM_CACHE_TTL = 24 * 60 * 60  # seconds
+
+
+@st.cache_resource
+def _open_db():
+    """One autocommit WAL connection per process, shared across reruns and sessions."""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-20000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn, threading.Lock()
+
+
+_CONN, _LOCK = _open_db()
+
+
+def init_db():
+    with _LOCK:
+        _CONN.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                answer TEXT,
+                created_at INTEGER
+            )
+        """
+        )
+        _CONN.execute(
+            """
+            CREATE TABLE IF NOT EXISTS web_cache (
+                key TEXT PRIMARY KEY,
+                json TEXT,
+                ts INTEGER
+            )
+        """
+        )
+        _CONN.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sem_cache (
+                id INTEGER PRIMARY KEY,
+                embedding BLOB,
+                question TEXT,
+                answer TEXT
+            )
+        """
+        )
+
+
+init_db()
+
+
+def normalize(text: str) -> str:
+    """Canonical form for cache keys and embeddings: NFKC, lowercase, single spaces, no edge ?.!"""
+    text = " ".join(unicodedata.normalize("NFKC", text).lower().split())
+    return text.strip(" ?.!")
+
+
+def cache_key(topic: str) -> str:
+    raw = f"{AZURE_MODEL}|{AZURE_API_VERSION}|{normalize(topic)}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def get_cached_outputs(key: str):
+    with _LOCK:
+        row = _CONN.execute(
+            "SELECT answer FROM llm_cache WHERE key = ? AND created_at > ?",
+            (key, int(time.time()) - LLM_CACHE_TTL),
+        ).fetchone()
+    return orjson.loads(row[0]) if row else None
+
+
+def put_cached_outputs(key: str, outputs: Dict[str, Any]):
+    with _LOCK:
+        _CONN.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, answer, created_at) VALUES (?, ?, ?)",
+            (key, orjson.dumps(outputs).decode(), int(time.time())),
+        )
+
+
+# ----------------------- Semantic Cache -----------------------
+SEM_INDEX_PATH = os.path.join(os.path.dirname(__file__), "sem_cache.faiss")
+SEM_CACHE_THRESHOLD = 0.92  # cosine similarity
+EMBED_MODEL = "all-MiniLM-L6-v2"
+EMBED_DIM = 384
+
+
+@st.cache_resource
+def get_encoder() -> SentenceTransformer:
+    return SentenceTransformer(EMBED_MODEL)
+
+
+def _build_sem_index() -> faiss.Index:
+    index = faiss.IndexIDMap(faiss.IndexFlatIP(EMBED_DIM))
+    with _LOCK:
+        rows = _CONN.execute("SELECT id, embedding FROM sem_cache").fetchall()
+    if rows:
+        ids = np.array([r[0] for r in rows], dtype="int64")
+        vecs = np.vstack([np.frombuffer(r[1], dtype="float32") for r in rows])
+        index.add_with_ids(vecs, ids)
+    return index
+
+
+@st.cache_resource
+def get_sem_index():
+    """Load the persisted FAISS index (rebuilt from sem_cache if missing or stale)."""
+    with _LOCK:
+        count = _CONN.execute("SELECT COUNT(*) FROM sem_cache").fetchone()[0]
+    index = None
+    if os.path.exists(SEM_INDEX_PATH):
+        index = faiss.read_index(SEM_INDEX_PATH)
+        if index.ntotal != count:
+            index = None
+    if index is None:
+        index = _build_sem_index()
+    atexit.register(faiss.write_index, index, SEM_INDEX_PATH)
+    return index, threading.Lock()
+
+
+def embed(text: str) -> np.ndarray:
+    vec = get_encoder().encode(normalize(text), normalize_embeddings=True)
+    return vec.astype("float32")
+
+
+def sem_lookup(vec: np.ndarray):
+    index, lock = get_sem_index()
+    with lock:
+        if index.ntotal == 0:
+            return None
+        scores, ids = index.search(vec[None, :], 1)
+    if scores[0, 0] < SEM_CACHE_THRESHOLD:
+        return None
+    with _LOCK:
+        row = _CONN.execute(
+            "SELECT answer FROM sem_cache WHERE id = ?", (int(ids[0, 0]),)
+        ).fetchone()
+    return orjson.loads(row[0]) if row else None
+
+
+def sem_store(vec: np.ndarray, topic: str, outputs: Dict[str, Any]):
+    with _LOCK:
+        cur = _CONN.execute(
+            "INSERT INTO sem_cache (embedding, question, answer) VALUES (?, ?, ?)",
+            (vec.tobytes(), topic, orjson.dumps(outputs).decode()),
+        )
+    index, lock = get_sem_index()
+    with lock:
+        index.add_with_ids(vec[None, :], np.array([cur.lastrowid], dtype="int64"))
+
+
 # ----------------------- Free Web Search Tool -----------------------
+# News goes stale quickly; general text results are kept for a day.
+WEB_CACHE_TTL = {"news": 60 * 60, "text": 24 * 60 * 60}  # seconds
+
+
+def web_cache_key(
+    query: str, region: str, max_results: int, kind: str, now: int
+) -> str:
+    bucket = now // WEB_CACHE_TTL[kind]
+    raw = f"{kind}|{query}|{region}|{max_results}|{bucket}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def get_cached_search(query: str, region: str, max_results: int, now: int):
+    keys = [web_cache_key(query, region, max_results, k, now) for k in WEB_CACHE_TTL]
+    with _LOCK:
+        for key in keys:
+            row = _CONN.execute(
+                "SELECT json FROM web_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row:
+                return row[0]
+    return None
+
+
+def put_cached_search(key: str, payload: str, now: int):
+    with _LOCK:
+        _CONN.execute(
+            "INSERT OR REPLACE INTO web_cache (key, json, ts) VALUES (?, ?, ?)",
+            (key, payload, now),
+        )
+        _CONN.execute(
+            "DELETE FROM web_cache WHERE ts < ?", (now - max(WEB_CACHE_TTL.values()),)
+        )
+
+
+def _news_search(query: str, region: str, max_results: int) -> List[Dict[str, Any]]:
+    ddgs, lock = ddgs_client("news")
+    with lock:
+        rows = ddgs.news(query, region=region, max_results=max_results)
+    # News is more recent; field names vary by version.
+    return [
+        {
+            "title": r.get("title") or r.get("source") or "",
+            "url": r.get("url") or r.get("link") or "",
+            "snippet": r.get("excerpt") or r.get("body") or "",
+            "date": r.get("date") or r.get("published") or "",
+            "source": r.get("source") or r.get("publisher") or "",
+        }
+        for r in rows
+    ]
+
+
+def _text_search(query: str, region: str, max_results: int) -> List[Dict[str, Any]]:
+    ddgs, lock = ddgs_client("text")
+    with lock:
+        rows = ddgs.text(query, region=region, max_results=max_results)
+    return [
+        {
+            "title": r.get("title") or "",
+            "url": r.get("href") or r.get("url") or "",
+            "snippet": r.get("body") or r.get("snippet") or "",
+            "date": r.get("date") or "",
+            "source": r.get("source") or "",
+        }
+        for r in rows
+    ]
 
 
 @tool("web_search")
@@ -41,143 +271,260 @@ def web_search(query: str, max_results: int = 8, region: str = "us-en") -> str:
     Prefers news results; falls back to text search if needed.
     """
     try:
-        results: List[Dict[str, Any]] = []
-        with DDGS() as ddgs:
-            # Try news (more recent); field names vary by version.
+        now = int(time.time())
+        cached = get_cached_search(query, region, max_results, now)
+        if cached is not None:
+            logging.info(f"web_search cache hit for '{query}'.")
+            return cached
+
+        # Fire news and text searches together so the fallback costs no extra round-trip
+        pool = ThreadPoolExecutor(max_workers=2)
+        try:
+            f_news = pool.submit(_news_search, query, region, max_results)
+            f_text = pool.submit(_text_search, query, region, max_results)
             try:
-                for r in ddgs.news(query, region=region, max_results=max_results):
-                    results.append(
-                        {
-                            "title": r.get("title") or r.get("source") or "",
-                            "url": r.get("url") or r.get("link") or "",
-                            "snippet": r.get("excerpt") or r.get("body") or "",
-                            "date": r.get("date") or r.get("published") or "",
-                            "source": r.get("source") or r.get("publisher") or "",
-                        }
-                    )
+                results = f_news.result()
             except Exception:
-                pass
-
-            if not results:
+                results = []
+            kind = "news"
+            if results:
+                f_text.cancel()
+            else:
                 # Fallback to general text search
-                for r in ddgs.text(query, region=region, max_results=max_results):
-                    results.append(
-                        {
-                            "title": r.get("title") or "",
-                            "url": r.get("href") or r.get("url") or "",
-                            "snippet": r.get("body") or r.get("snippet") or "",
-                            "date": r.get("date") or "",
-                            "source": r.get("source") or "",
-                        }
-                    )
-        return json.dumps({"results": results})
+                kind = "text"
+                results = f_text.result()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        payload = orjson.dumps({"results": results}).decode()
+        if results:
+            put_cached_search(
+                web_cache_key(query, region, max_results, kind, now), payload, now
+            )
+        return payload
     except Exception as e:
         logging.exception(e)
-        return json.dumps({"results": [], "error": str(e)})
+        return orjson.dumps({"results": [], "error": str(e)}).decode()
 
 
-# ----------------------- LLM (Azure via CrewAI) -----------------------
-# Keep same pattern as your working CrewAI FAQ agent
-crew_llm = LLM(
-    model=f"azure/{AZURE_MODEL}",
-    api_key=AZURE_API_KEY,
-    api_base=AZURE_ENDPOINT,
-    api_version=AZURE_API_VERSION,
-)
+# ----------------------- Agents, Tasks & Crews -----------------------
+# The post is capped at ~200 words plus three reference links, so the writer and
+# editor get output-token limits; MAX_POST_CHARS is a last guard before rendering.
+WRITER_MAX_TOKENS = 450
+EDITOR_MAX_TOKENS = 600
+MAX_POST_CHARS = 3000
 
-# ----------------------- Agents -----------------------
-researcher = Agent(
-    role="Researcher",
-    goal="Gather recent, credible information on a given topic and summarize concisely with citations.",
-    backstory="A pragmatic web researcher who prioritizes recency, source credibility, and concise synthesis.",
-    tools=[web_search],
-    llm=crew_llm,
-    allow_delegation=False,
-    verbose=False,
-)
 
-writer = Agent(
-    role="Writer",
-    goal="Draft a short, structured blog post based on the research summary and sources.",
-    backstory="A clear, concise technical writer who can turn notes into a readable blog draft.",
-    llm=crew_llm,
-    allow_delegation=False,
-    verbose=False,
-)
+# Streamlit re-executes this script on every widget interaction, so the LLM clients
+# are built once per process.
+@st.cache_resource
+def get_llms():
+    # LLM (Azure via CrewAI) — same pattern as the CrewAI FAQ agent
+    azure = dict(
+        model=f"azure/{AZURE_MODEL}",
+        api_key=AZURE_API_KEY,
+        api_base=AZURE_ENDPOINT,
+        api_version=AZURE_API_VERSION,
+    )
+    crew_llm = LLM(**azure)
+    # Only the writer streams. A streamed kickoff switches stream on for every
+    # agent's LLM in that crew, so the writer has its own client and crew, and
+    # the JSON-producing researcher/SEO editor keep plain responses.
+    writer_llm = LLM(**azure, max_tokens=WRITER_MAX_TOKENS, stream=True)
+    editor_llm = LLM(**azure, max_tokens=EDITOR_MAX_TOKENS)
+    return crew_llm, writer_llm, editor_llm
 
-editor = Agent(
-    role="Editor",
-    goal="Polish the draft for grammar, tone, and SEO (title, meta, keywords).",
-    backstory="A meticulous editor who improves clarity and SEO without changing factual content.",
-    llm=crew_llm,
-    allow_delegation=False,
-    verbose=False,
-)
 
-# ----------------------- Tasks -----------------------
-# 1) Research: use web_search tool, produce JSON summary + sources
-research_task = Task(
-    description=(
-        "Use the web_search tool to gather recent information on the topic '{topic}'. "
-        "Focus on credibility and recency. Produce a JSON object ONLY:\n"
-        "{{\n"
-        '  "summary": "4-6 bullet points capturing the key insights (no more than ~120 words total)",\n'
-        '  "sources": [\n'
-        '    {{"title": "...", "url": "https://...", "source": "...", "date": "YYYY-MM-DD"}},\n'
-        "    ... up to 3 items MAX\n"
-        "  ]\n"
-        "}}\n"
-        "Rules: Each source MUST have a non-empty http/https URL; skip any without. Limit to 3 sources. Keep JSON compact."
-    ),
-    expected_output='JSON with keys "summary" (string) and "sources" (list)',
-    agent=researcher,
-    tools=[web_search],
-)
+# Agents, tasks and crews are cheap objects but not shareable: kickoff(inputs=...)
+# interpolates {topic}/{draft} into the Task descriptions and stores outputs on
+# them, so concurrent sessions each get their own set.
+def build_crews():
+    crew_llm, writer_llm, editor_llm = get_llms()
 
-# 2) Write: create a short blog draft from research JSON
-write_task = Task(
-    description=(
-        "You will receive the research JSON from the previous task as context. "
-        "Write a concise blog draft (no more than 200 words) about '{topic}'. "
-        "Structure in Markdown with sections:\n"
-        "## Title (compelling)\n\n"
-        "### Introduction\n"
-        "### Key Developments\n"
-        "### Implications and Outlook\n"
-        "### Conclusion\n\n"
-        "Embed bracketed citations like [1], [2], [3] referring to the order of 'sources' in the research JSON. "
-        "At the end of the post, add a 'References' section listing up to 3 sources as markdown links in the format: [1]: url, [2]: url, [3]: url. "
-        "Only include sources with valid, non-empty URLs. Skip any sources with missing or empty URLs. "
-        "Do not fabricate facts; rely only on the provided summary and links."
-    ),
-    expected_output="Markdown blog draft only (with bracketed citations and a References section with up to 3 links).",
-    agent=writer,
-)
+    # Agents
+    researcher = Agent(
+        role="Researcher",
+        goal="Gather recent, credible information on a given topic and summarize concisely with citations.",
+        backstory="A pragmatic web researcher who prioritizes recency, source credibility, and concise synthesis.",
+        tools=[web_search],
+        llm=crew_llm,
+        allow_delegation=False,
+        verbose=False,
+    )
 
-# 3) Edit: polish for grammar/tone + SEO metadata
-edit_task = Task(
-    description=(
-        "Edit the provided draft for grammar, clarity, and tone. Improve SEO by producing:\n"
-        "- seo_title (<=60 chars)\n- meta_description (<=160 chars)\n- 5 to 8 keywords\n\n"
-        "Return JSON ONLY with keys:\n"
-        "{\n"
-        '  "final_markdown": "<polished markdown>",\n'
-        '  "seo_title": "...",\n'
-        '  "meta_description": "...",\n'
-        '  "keywords": ["...", "..."]\n'
-        "}\n"
-        "Keep the content faithful to the sources and citations already included."
-    ),
-    expected_output='JSON with keys "final_markdown", "seo_title", "meta_description", "keywords".',
-    agent=editor,
-)
+    writer = Agent(
+        role="Writer",
+        goal="Draft a short, structured blog post based on the research summary and sources.",
+        backstory="A clear, concise technical writer who can turn notes into a readable blog draft.",
+        llm=writer_llm,
+        allow_delegation=False,
+        verbose=False,
+    )
+
+    editor = Agent(
+        role="Editor",
+        goal="Polish the draft for grammar, clarity, and tone.",
+        backstory="A meticulous editor who improves clarity without changing factual content.",
+        llm=editor_llm,
+        allow_delegation=False,
+        verbose=False,
+    )
+
+    seo_editor = Agent(
+        role="SEO Editor",
+        goal="Write SEO metadata (title, meta description, keywords) for a blog draft.",
+        backstory="A search-savvy editor who writes concise, accurate metadata without touching the post itself.",
+        llm=crew_llm,
+        allow_delegation=False,
+        verbose=False,
+    )
+
+    # Tasks
+    # 1) Research: use web_search tool, produce JSON summary + sources
+    research_task = Task(
+        description=(
+            "Use the web_search tool to gather recent information on the topic '{topic}'. "
+            "Focus on credibility and recency. Produce a JSON object ONLY:\n"
+            "{{\n"
+            '  "summary": "4-6 bullet points capturing the key insights (no more than ~120 words total)",\n'
+            '  "sources": [\n'
+            '    {{"title": "...", "url": "https://...", "source": "...", "date": "YYYY-MM-DD"}},\n'
+            "    ... up to 3 items MAX\n"
+            "  ]\n"
+            "}}\n"
+            "Rules: Each source MUST have a non-empty http/https URL; skip any without. Limit to 3 sources. Keep JSON compact."
+        ),
+        expected_output='JSON with keys "summary" (string) and "sources" (list)',
+        agent=researcher,
+        tools=[web_search],
+    )
+
+    # 2) Write: create a short blog draft from research JSON
+    write_task = Task(
+        description=(
+            "Write a concise blog draft (no more than 200 words) about '{topic}'. "
+            "Structure in Markdown with sections:\n"
+            "## Title (compelling)\n\n"
+            "### Introduction\n"
+            "### Key Developments\n"
+            "### Implications and Outlook\n"
+            "### Conclusion\n\n"
+            "Embed bracketed citations like [1], [2], [3] referring to the order of 'sources' in the research JSON. "
+            "At the end of the post, add a 'References' section listing up to 3 sources as markdown links in the format: [1]: url, [2]: url, [3]: url. "
+            "Only include sources with valid, non-empty URLs. Skip any sources with missing or empty URLs. "
+            "Do not fabricate facts; rely only on the provided summary and links.\n\n"
+            "Research JSON:\n{research}"
+        ),
+        expected_output="Markdown blog draft only (with bracketed citations and a References section with up to 3 links).",
+        agent=writer,
+    )
+
+    # 3) Edit: the Markdown polish and the SEO metadata only depend on the draft,
+    #    so they are separate tasks that run concurrently.
+    edit_markdown_task = Task(
+        description=(
+            "Edit the following blog draft about '{topic}' for grammar, clarity, and tone. "
+            "Keep the content faithful to the sources and citations already included.\n\n"
+            "Draft:\n{draft}"
+        ),
+        expected_output="Polished Markdown blog post only.",
+        agent=editor,
+    )
+
+    edit_seo_task = Task(
+        description=(
+            "Produce SEO metadata for the following blog draft about '{topic}':\n"
+            "- seo_title (<=60 chars)\n- meta_description (<=160 chars)\n- 5 to 8 keywords\n\n"
+            "Return JSON ONLY with keys:\n"
+            "{\n"
+            '  "seo_title": "...",\n'
+            '  "meta_description": "...",\n'
+            '  "keywords": ["...", "..."]\n'
+            "}\n\n"
+            "Draft:\n{draft}"
+        ),
+        expected_output='JSON with keys "seo_title", "meta_description", "keywords".',
+        agent=seo_editor,
+    )
+
+    # Research -> write runs sequentially (the research JSON is handed to the
+    # writer as {research}); each edit pass gets its own crew so both LLM calls
+    # can be in flight at the same time.
+    research_crew = Crew(
+        agents=[researcher], tasks=[research_task], process=Process.sequential
+    )
+    write_crew = Crew(
+        agents=[writer],
+        tasks=[write_task],
+        process=Process.sequential,
+        stream=True,  # kickoff() yields token chunks; the CrewOutput is on .result
+    )
+    markdown_crew = Crew(
+        agents=[editor], tasks=[edit_markdown_task], process=Process.sequential
+    )
+    seo_crew = Crew(
+        agents=[seo_editor], tasks=[edit_seo_task], process=Process.sequential
+    )
+    return research_crew, write_crew, markdown_crew, seo_crew, writer
+
+
+def strip_code_fence(text: str) -> str:
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.removesuffix("```")
+    return text.strip()
+
+
+@st.cache_data
+def _refs_block(urls: tuple) -> str:
+    """Markdown reference lines for the first 3 http(s) URLs; cached across reruns."""
+    refs = [u for url in urls if (u := url.strip()).startswith("http")][:3]
+    return "\n".join(f"[{i+1}]: {u}" for i, u in enumerate(refs))
+
+
+def stream_text(streaming: Iterable, agent: Agent) -> Iterator[str]:
+    """Yield the text tokens produced by the given agent during a streamed kickoff.
+
+    CrewAI's stream handler listens on the process-wide event bus, so the stream
+    also carries other sessions' chunks; the per-run agent id tells them apart
+    (roles are the same in every session).
+    """
+    agent_id = str(agent.id)
+    for chunk in streaming:
+        if chunk.chunk_type == StreamChunkType.TEXT and chunk.agent_id == agent_id:
+            yield chunk.content
+
+
+async def _run_edits(markdown_crew, seo_crew, inputs: Dict[str, Any]):
+    return await asyncio.gather(
+        markdown_crew.kickoff_async(inputs=inputs),
+        seo_crew.kickoff_async(inputs=inputs),
+    )
+
+
+def run_pipeline(topic: str, live) -> Dict[str, Any]:
+    """Research and draft sequentially, then run both edit passes in parallel.
+
+    The writer's draft is streamed into the ``live`` placeholder as it is generated.
+    """
+    research_crew, write_crew, markdown_crew, seo_crew, writer = build_crews()
+    research = research_crew.kickoff(inputs={"topic": topic}).raw
+    streaming = write_crew.kickoff(inputs={"topic": topic, "research": research})
+    live.write_stream(stream_text(streaming, writer))
+    draft = streaming.result.raw
+    md_result, seo_result = asyncio.run(
+        _run_edits(markdown_crew, seo_crew, {"topic": topic, "draft": draft})
+    )
+    try:
+        final_obj = orjson.loads(strip_code_fence(seo_result.raw))
+    except Exception:
+        # If the SEO editor returned plain text for some reason, drop it
+        final_obj = {}
+    if not isinstance(final_obj, dict):
+        final_obj = {}
+    final_obj["final_markdown"] = strip_code_fence(md_result.raw)[:MAX_POST_CHARS]
+    return final_obj
 
-# For apples-to-apples simplicity, we'll run one sequential crew for all three tasks.
-crew = Crew(
-    agents=[researcher, writer, editor],
-    tasks=[research_task, write_task, edit_task],
-    process=Process.sequential,
-)
 
 # ----------------------- Streamlit UI -----------------------
 st.set_page_config(page_title="🧭 Research → Write → Edit (CrewAI)", layout="wide")
@@ -198,55 +545,59 @@ if st.button("Run Pipeline"):
         st.warning("Please enter a topic.")
     else:
         try:
-            result = crew.kickoff(inputs={"topic": topic})
-            # Crew returns the final task output (editor JSON). We also reconstruct step logs.
-            # For transparency, run a lightweight search to record a 'research step' entry.
-            raw_search = web_search.run(topic)
-            try:
-                parsed_search = json.loads(raw_search)
-            except Exception:
-                parsed_search = {"results": []}
-
-            # Log steps similar to your FAQ pattern
-            st.session_state.steps.append(
-                {
-                    "step": "research",
-                    "result": f"Ran web_search for '{topic}' and summarized sources.",
-                }
-            )
-            st.session_state.steps.append(
-                {
-                    "step": "write",
-                    "result": "Drafted a concise blog post from the research JSON.",
-                }
-            )
-            st.session_state.steps.append(
-                {
-                    "step": "edit",
-                    "result": "Polished the draft for grammar/tone and added SEO metadata.",
-                }
-            )
-
-            # Parse final editor JSON
-            final_obj = {}
-            if hasattr(result, "output"):
-                # CrewOutput style
-                try:
-                    final_obj = json.loads(str(result.output))
-                except Exception:
-                    # If the editor returned plain text for some reason, wrap it
-                    final_obj = {"final_markdown": str(result.output)}
+            key = cache_key(topic)
+            cached = get_cached_outputs(key)
+            cache_step = "llm_cache"
+            if cached is None:
+                topic_vec = embed(topic)
+                cached = sem_lookup(topic_vec)
+                cache_step = "semantic_cache"
+            if cached is not None:
+                logging.info(f"{cache_step} hit for '{topic}'.")
+                st.session_state.steps.append(
+                    {
+                        "step": cache_step,
+                        "result": f"Served cached post for '{topic}'.",
+                    }
+                )
+                st.session_state.outputs = cached
             else:
-                # String
+                live = st.empty()
+                final_obj = run_pipeline(topic, live)
+                live.empty()
+                # For transparency, run a lightweight search to record a 'research step' entry.
+                raw_search = web_search.run(topic)
                 try:
-                    final_obj = json.loads(str(result))
+                    parsed_search = orjson.loads(raw_search)
                 except Exception:
-                    final_obj = {"final_markdown": str(result)}
+                    parsed_search = {"results": []}
 
-            st.session_state.outputs = {
-                "raw_search": parsed_search,
-                "final": final_obj,
-            }
+                # Log steps similar to your FAQ pattern
+                st.session_state.steps.append(
+                    {
+                        "step": "research",
+                        "result": f"Ran web_search for '{topic}' and summarized sources.",
+                    }
+                )
+                st.session_state.steps.append(
+                    {
+                        "step": "write",
+                        "result": "Drafted a concise blog post from the research JSON.",
+                    }
+                )
+                st.session_state.steps.append(
+                    {
+                        "step": "edit",
+                        "result": "Polished the draft and generated SEO metadata in parallel.",
+                    }
+                )
+
+                st.session_state.outputs = {
+                    "raw_search": parsed_search,
+                    "final": final_obj,
+                }
+                put_cached_outputs(key, st.session_state.outputs)
+                sem_store(topic_vec, topic, st.session_state.outputs)
         except Exception as e:
             logging.exception(e)
             st.error(f"Pipeline error: {e}")
@@ -278,15 +629,13 @@ if st.session_state.get("outputs"):
     if final_md:
         # Auto-inject a References section (up to 3 valid URLs) if missing
         if "References" not in final_md:
-            refs_urls: List[str] = []
-            for r in outputs.get("raw_search", {}).get("results", []):
-                url = (r.get("url") or "").strip()
-                if url.startswith("http"):
-                    refs_urls.append(url)
-                if len(refs_urls) >= 3:
-                    break
-            if refs_urls:
-                refs_block = "\n".join(f"[{i+1}]: {u}" for i, u in enumerate(refs_urls))
+            refs_block = _refs_block(
+                tuple(
+                    r.get("url") or ""
+                    for r in outputs.get("raw_search", {}).get("results", [])
+                )
+            )
+            if refs_block:
                 final_md = (
                     final_md.rstrip() + "\n\n### References\n" + refs_block + "\n"
                 )
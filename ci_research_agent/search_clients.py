@@ -0,0 +1,19 @@
+# search_clients.py
+
+import threading
+from functools import lru_cache
+
+
+# Streamlit re-executes app.py on every interaction but imports this module only
+# once, so the cache below lives for the whole process. A plain lru_cache also
+# works from the search worker threads, which have no Streamlit script context.
+@lru_cache(maxsize=None)
+def ddgs_client(kind: str):
+    """Long-lived DDGS client per search kind, so its HTTP sessions are reused.
+
+    News and text each get their own client and lock, keeping the two searches
+    in web_search concurrent while serialising calls on any one client.
+    """
+    from ddgs import DDGS  # imported on first search, not at app start
+
+    return DDGS(), threading.Lock()
@@ -1,14 +1,16 @@
 # data_cleaner_agent.py
 
 
+import io
 import os
 import re
+import importlib.util
 import logging
 from typing import Optional, List, Dict
 from datetime import datetime
 from dotenv import load_dotenv
 
-import pandas as pd
+import polars as pl
 import streamlit as st
 
 
@@ -18,7 +20,7 @@ from langchain_core.tools import StructuredTool
 from langchain_openai import AzureChatOpenAI
 from langchain.agents import create_openai_functions_agent, AgentExecutor
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.memory import ConversationBufferMemory
+from langchain.memory import ConversationBufferWindowMemory
 from langchain_core.messages import HumanMessage, AIMessage
 
 
@@ -37,42 +39,110 @@ load_dotenv()
 
 
 # --- Global DataFrame state ---
+# The working data is a Polars LazyFrame: each tool appends expressions to the
+# plan and collects it once, then stores the result back as a cheap lazy scan.
 if "original_df" not in st.session_state:
     st.session_state.original_df = None
 if "file_loaded" not in st.session_state:
     st.session_state.file_loaded = None
+if "csv_bytes" not in st.session_state:
+    st.session_state.csv_bytes = None
+
+# Streamlit ships the whole frame to the browser as Arrow on every rerun, so the
+# previews only show the head; the download button still has every row.
+PREVIEW_ROWS = 500
+
+EMAIL_RE = r"([A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,})"
+# Tried in order for each value; the first format that parses wins (month-first,
+# as pandas' default dayfirst=False did). Two-digit years come before four-digit
+# ones, since %Y would otherwise read "01/15/23" as the year 23.
+DATE_FORMATS = (
+    "%Y-%m-%dT%H:%M:%S%.f",
+    "%Y-%m-%d %H:%M:%S%.f",
+    "%Y-%m-%d",
+    "%m-%d-%y",
+    "%m-%d-%Y",
+    "%Y/%m/%d",
+    "%m/%d/%y",
+    "%m/%d/%Y",
+    "%B %d, %Y",
+    "%b %d, %Y",
+    "%B %d %Y",
+    "%b %d %Y",
+    "%d %B %Y",
+    "%d %b %Y",
+    "%d-%b-%Y",
+)
+
+# Optional NVIDIA GPU execution via Polars' cuDF engine (USE_CUDF=1 plus the
+# cudf-polars package). Operations the GPU engine can't run fall back to the CPU.
+COLLECT_ENGINE = "auto"
+if os.getenv("USE_CUDF") == "1":
+    if importlib.util.find_spec("cudf_polars"):
+        COLLECT_ENGINE = "gpu"
+    else:
+        logging.warning("USE_CUDF=1 but cudf-polars is not installed; using CPU.")
 
 
 def load_dataframe(file) -> Dict:
     try:
         _, ext = os.path.splitext(file.name.lower())
         if ext in (".csv",):
-            df = pd.read_csv(file)
+            # Empty fields (quoted or not) are nulls, as with pandas' read_csv
+            # Infer dtypes from every row (like pandas), not just the first 100
+            lf = pl.scan_csv(file, null_values=[""], infer_schema_length=None)
         elif ext in (".xls", ".xlsx"):
-            df = pd.read_excel(file)
+            lf = pl.read_excel(file).lazy()
         else:
             raise ValueError(f"Unsupported format: {ext}")
-        st.session_state.original_df = df.copy()
-        st.session_state.df_global = df.copy()
-        logging.info(f"Loaded dataframe: {df.shape[0]} rows, {df.shape[1]} columns.")
-        return {"rows": df.shape[0], "columns": df.shape[1]}
+        df = lf.collect()
+        # Polars frames are immutable, so both references share the same buffers
+        st.session_state.original_df = df
+        st.session_state.lf = df.lazy()
+        st.session_state.csv_bytes = None
+        logging.info(f"Loaded dataframe: {df.height} rows, {df.width} columns.")
+        return {"rows": df.height, "columns": df.width}
     except Exception as e:
         logging.error(f"Error loading dataframe: {e}")
         raise
 
 
+def _columns() -> List[str]:
+    return st.session_state.lf.collect_schema().names()
+
+
+def _commit(lf: pl.LazyFrame) -> pl.DataFrame:
+    """Execute the tool's plan once and keep the result as the new state."""
+    df = lf.collect(engine=COLLECT_ENGINE)
+    st.session_state.lf = df.lazy()
+    st.session_state.csv_bytes = None
+    return df
+
+
+def _csv_bytes() -> bytes:
+    """CSV export of the current data, re-encoded only after it changes."""
+    if st.session_state.csv_bytes is None:
+        # Polars' writer emits UTF-8 straight into the buffer, so there is no
+        # intermediate Python str followed by an .encode() copy
+        buf = io.BytesIO()
+        st.session_state.lf.collect().write_csv(buf)
+        st.session_state.csv_bytes = buf.getvalue()
+    return st.session_state.csv_bytes
+
+
 # --- Cleaning tools ---
 def remove_duplicates() -> str:
     try:
-        df = st.session_state.df_global
-        before = len(df)
+        lf = st.session_state.lf
+        before = lf.select(pl.len()).collect().item()
         # Strip whitespace from all string columns to ensure true duplicate detection
-        str_cols = df.select_dtypes(include=["object"]).columns
-        df[str_cols] = df[str_cols].apply(lambda x: x.str.strip())
-        df = df.drop_duplicates().reset_index(drop=True)
-        after = len(df)
-        st.session_state.df_global = df
-        msg = f"Removed {before-after} duplicate rows. DataFrame now has {df.shape[0]} rows, {df.shape[1]} columns."
+        df = _commit(
+            lf.with_columns(pl.col(pl.String).str.strip_chars()).unique(
+                maintain_order=True
+            )
+        )
+        after = df.height
+        msg = f"Removed {before-after} duplicate rows. DataFrame now has {df.height} rows, {df.width} columns."
         logging.info(msg)
         return msg
     except Exception as e:
@@ -82,17 +152,39 @@ def remove_duplicates() -> str:
 
 def standardize_dates(column: str, date_format: str = "%Y-%m-%d") -> str:
     try:
-        df = st.session_state.df_global
-        if column not in df.columns:
+        lf = st.session_state.lf
+        schema = lf.collect_schema()
+        if column not in schema:
             msg = f"Column '{column}' not found."
             logging.warning(msg)
             return msg
-        parsed = pd.to_datetime(df[column], errors="coerce", dayfirst=False)
-        current_date = pd.Timestamp.now().strftime(date_format)
-        parsed_filled = parsed.fillna(current_date)
-        df[column] = pd.to_datetime(parsed_filled).dt.strftime(date_format)
-        st.session_state.df_global = df
-        msg = f"Standardized all entries in column '{column}' to {date_format}. Empty values set to current date ({current_date}). DataFrame now has {df.shape[0]} rows, {df.shape[1]} columns."
+        current_date = datetime.now().strftime(date_format)
+        if schema[column].is_temporal():
+            text = None
+            empty = pl.col(column).is_null()
+            formatted = pl.col(column).dt.strftime(date_format)
+        else:
+            text = pl.col(column).cast(pl.String).str.strip_chars()
+            empty = text.fill_null("") == ""
+            formatted = pl.coalesce(
+                [text.str.to_datetime(fmt, strict=False) for fmt in DATE_FORMATS]
+            ).dt.strftime(date_format)
+        # Only empty cells get today's date; values in a format we can't parse
+        # are kept as they were rather than overwritten
+        df = _commit(
+            lf.with_columns(
+                pl.when(empty)
+                .then(pl.lit(current_date))
+                .otherwise(formatted if text is None else formatted.fill_null(text))
+                .alias(column)
+            )
+        )
+        unparsed = 0
+        if text is not None:
+            unparsed = lf.select((~empty & formatted.is_null()).sum()).collect().item()
+        msg = f"Standardized all entries in column '{column}' to {date_format}. Empty values set to current date ({current_date}). DataFrame now has {df.height} rows, {df.width} columns."
+        if unparsed:
+            msg += f" {unparsed} values in an unrecognized date format were left unchanged."
         logging.info(msg)
         return msg
     except Exception as e:
@@ -102,22 +194,20 @@ def standardize_dates(column: str, date_format: str = "%Y-%m-%d") -> str:
 
 def extract_emails(source_column: str, target_column: str = "extracted_email") -> str:
     try:
-        df = st.session_state.df_global
-        if source_column not in df.columns:
+        if source_column not in _columns():
             msg = f"Column '{source_column}' not found."
             logging.warning(msg)
             return msg
-        emails = (
-            df[source_column]
-            .astype(str)
-            .str.extract(
-                r"([A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,})", expand=False
+        df = _commit(
+            st.session_state.lf.with_columns(
+                pl.col(source_column)
+                .cast(pl.String)
+                .str.extract(EMAIL_RE, 1)
+                .alias(target_column)
             )
         )
-        df[target_column] = emails
-        st.session_state.df_global = df
-        count = emails.notna().sum()
-        msg = f"Extracted {count} emails into new column '{target_column}'. DataFrame now has {df.shape[0]} rows, {df.shape[1]} columns."
+        count = df.height - df[target_column].null_count()
+        msg = f"Extracted {count} emails into new column '{target_column}'. DataFrame now has {df.height} rows, {df.width} columns."
         logging.info(msg)
         return msg
     except Exception as e:
@@ -127,11 +217,13 @@ def extract_emails(source_column: str, target_column: str = "extracted_email") -
 
 def drop_empty_columns(threshold: float = 0.5) -> str:
     try:
-        df = st.session_state.df_global
-        n = len(df)
-        drops = [col for col in df.columns if df[col].isna().sum() / n > threshold]
-        df = df.drop(columns=drops)
-        st.session_state.df_global = df
+        lf = st.session_state.lf
+        # Null fraction of every column in one pass
+        null_fracs = (
+            lf.select(pl.all().null_count() / pl.len()).collect().row(0, named=True)
+        )
+        drops = [col for col, frac in null_fracs.items() if frac > threshold]
+        _commit(lf.drop(drops))
         if drops:
             msg = f"Dropped columns: {', '.join(drops)}."
         else:
@@ -147,22 +239,45 @@ def fill_missing(
     column: str, method: str = "constant", value: Optional[str] = None
 ) -> str:
     try:
-        df = st.session_state.df_global
-        if column not in df.columns:
+        lf = st.session_state.lf
+        if column not in _columns():
             msg = f"Column '{column}' not found."
             logging.warning(msg)
             return msg
-        missing_before = df[column].isna().sum()
-        if method == "mean":
-            df[column] = pd.to_numeric(df[column], errors="coerce")
-            fill = df[column].mean()
-        elif method == "median":
-            df[column] = pd.to_numeric(df[column], errors="coerce")
-            fill = df[column].median()
+        if method in ("mean", "median"):
+            dtype = lf.collect_schema()[column]
+            # The statistic needs floats, but only this one column is cast and
+            # collected to compute it
+            s = lf.select(pl.col(column).cast(pl.Float64, strict=False)).collect(
+                engine=COLLECT_ENGINE
+            )[column]
+            missing_before = s.null_count()
+            fill = s.mean() if method == "mean" else s.median()
+            if dtype.is_numeric():
+                # A numeric column keeps its dtype unless the statistic has a
+                # fraction it can't hold (then Polars widens it to Float64)
+                if missing_before:
+                    fill_expr = pl.lit(fill)
+                    if dtype.is_integer() and fill is not None and fill == int(fill):
+                        fill_expr = fill_expr.cast(dtype)
+                    _commit(lf.with_columns(pl.col(column).fill_null(fill_expr)))
+            else:
+                # Text column: coerce to numbers first, as pd.to_numeric did
+                _commit(lf.with_columns(s.fill_null(fill).alias(column)))
         else:
             fill = value
-        df[column] = df[column].fillna(fill)
-        st.session_state.df_global = df
+            missing_before = lf.select(pl.col(column).null_count()).collect().item()
+            if missing_before:
+                # Fill with the column's own dtype when the value converts (so "0"
+                # keeps an Int64 column Int64); otherwise the column becomes text,
+                # as pandas' fillna turned it into an object column
+                dtype = lf.collect_schema()[column]
+                fill_expr = pl.lit(value)
+                if dtype != pl.String:
+                    typed = pl.lit(value).cast(dtype, strict=False)
+                    if pl.select(typed).item() is not None:
+                        fill_expr = typed
+                _commit(lf.with_columns(pl.col(column).fill_null(fill_expr)))
         msg = f"Filled {missing_before} missing in '{column}' with {fill}."
         logging.info(msg)
         return msg
@@ -213,15 +328,6 @@ tools = [
 
 # --- Agent setup ---
 
-llm = AzureChatOpenAI(
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    api_version="2024-12-01-preview",
-    model=os.getenv("AZURE_OPENAI_MODEL_NAME"),
-    temperature=0,
-)
-
-
 prompt = ChatPromptTemplate.from_messages(
     [
         (
@@ -234,15 +340,36 @@ prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
-agent = create_openai_functions_agent(llm, tools, prompt)
-executor = AgentExecutor(
-    agent=agent,
-    tools=tools,
-    memory=memory,
-    verbose=True,
-    return_intermediate_steps=True,
-)
+
+@st.cache_resource
+def build_agent():
+    """LLM client and agent runnable hold no per-user state, so one per process."""
+    llm = AzureChatOpenAI(
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        api_version="2024-12-01-preview",
+        model=os.getenv("AZURE_OPENAI_MODEL_NAME"),
+        temperature=0,
+    )
+    return llm, create_openai_functions_agent(llm, tools, prompt)
+
+
+llm, agent = build_agent()
+
+# The executor owns the chat memory, so it is kept per browser session instead
+# of in the process-wide cache (users must not share one history).
+# Only the last 6 exchanges go back to the model, so prompt size stays bounded
+if "executor" not in st.session_state:
+    st.session_state.executor = AgentExecutor(
+        agent=agent,
+        tools=tools,
+        memory=ConversationBufferWindowMemory(
+            memory_key="chat_history", return_messages=True, k=6
+        ),
+        verbose=False,
+        return_intermediate_steps=True,
+    )
+executor = st.session_state.executor
 
 # --- Streamlit UI ---
 st.set_page_config(page_title="LLM Data Wrangler Agent", layout="wide")
@@ -257,19 +384,24 @@ if uploaded:
         st.session_state.file_loaded = uploaded.name
         st.success(f"Loaded {summary['rows']} rows × {summary['columns']} columns.")
 
-    st.write(f"### Preview (All Rows)")
-    st.dataframe(st.session_state.df_global)
+    st.write(f"### Preview (first {PREVIEW_ROWS} rows)")
+    st.dataframe(
+        st.session_state.lf.head(PREVIEW_ROWS).collect(), use_container_width=True
+    )
 
     col1, col2 = st.columns([1, 1])
     with col1:
         if st.button("Reset to Original Data"):
-            st.session_state.df_global = st.session_state.original_df.copy()
+            st.session_state.lf = st.session_state.original_df.lazy()
+            st.session_state.csv_bytes = None
             st.success("Data reset to original upload.")
             st.rerun()
     with col2:
-        csv = st.session_state.df_global.to_csv(index=False).encode("utf-8")
         st.download_button(
-            "Download cleaned CSV", data=csv, file_name="cleaned.csv", mime="text/csv"
+            "Download cleaned CSV",
+            data=_csv_bytes(),
+            file_name="cleaned.csv",
+            mime="text/csv",
         )
 
     user_input = st.text_input(
@@ -292,8 +424,10 @@ if uploaded:
             ):
                 st.markdown(f"**Agent:** {st.session_state.history[-1].content}")
 
-        st.write(f"### After Cleaning Preview (All Rows)")
-        st.dataframe(st.session_state.df_global)
+        st.write(f"### After Cleaning Preview (first {PREVIEW_ROWS} rows)")
+        st.dataframe(
+            st.session_state.lf.head(PREVIEW_ROWS).collect(), use_container_width=True
+        )
 
 else:
     st.info("Please upload a CSV or XLSX file to begin.")
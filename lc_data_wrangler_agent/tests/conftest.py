@@ -0,0 +1,9 @@
+import os
+import sys
+
+# app.py is a Streamlit script: importing it outside `streamlit run` executes the
+# page in bare mode, which only needs the Azure settings to be present
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://localhost")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_MODEL_NAME", "test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
@@ -0,0 +1,107 @@
+from datetime import datetime
+
+import polars as pl
+import pytest
+
+import app
+
+
+def load(**columns):
+    app.st.session_state.lf = pl.DataFrame(columns).lazy()
+
+
+def current() -> pl.DataFrame:
+    return app.st.session_state.lf.collect()
+
+
+def test_fill_missing_constant_keeps_numeric_dtype():
+    load(n=[1, None, 3])
+    assert "Filled 1 missing" in app.fill_missing("n", "constant", "0")
+    df = current()
+    assert df["n"].dtype == pl.Int64
+    assert df["n"].to_list() == [1, 0, 3]
+
+
+def test_fill_missing_constant_non_numeric_value_turns_column_to_text():
+    load(n=[1, None, 3])
+    app.fill_missing("n", "constant", "n/a")
+    df = current()
+    assert df["n"].dtype == pl.String
+    assert df["n"].to_list() == ["1", "n/a", "3"]
+
+
+def test_fill_missing_constant_without_nulls_is_a_no_op():
+    load(n=[1, 2, 3])
+    assert "Filled 0 missing" in app.fill_missing("n", "constant", "n/a")
+    assert current()["n"].dtype == pl.Int64
+
+
+def test_fill_missing_mean_integral_keeps_int_dtype():
+    load(n=[1, None, 3])
+    app.fill_missing("n", "mean")
+    df = current()
+    assert df["n"].dtype == pl.Int64
+    assert df["n"].to_list() == [1, 2, 3]
+
+
+def test_fill_missing_median_fraction_widens_to_float():
+    load(n=[1, None, 2])
+    app.fill_missing("n", "median")
+    df = current()
+    assert df["n"].dtype == pl.Float64
+    assert df["n"].to_list() == [1.0, 1.5, 2.0]
+
+
+def test_fill_missing_mean_only_touches_selected_column():
+    load(n=[1, None, 3], s=["a", None, "c"])
+    app.fill_missing("n", "mean")
+    df = current()
+    assert df["s"].dtype == pl.String
+    assert df["s"].to_list() == ["a", None, "c"]
+
+
+def test_fill_missing_mean_on_text_column_coerces_to_float():
+    load(t=["1", None, "3", "x"])
+    app.fill_missing("t", "mean")
+    df = current()
+    assert df["t"].dtype == pl.Float64
+    assert df["t"].to_list() == [1.0, 2.0, 3.0, 2.0]
+
+
+def test_fill_missing_unknown_column():
+    load(n=[1])
+    assert app.fill_missing("nope") == "Column 'nope' not found."
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        "2023-01-15",
+        "2023-01-15T10:20:30",
+        "01/15/2023",
+        "01/15/23",
+        "Jan 15, 2023",
+        "January 15 2023",
+        "15-Jan-2023",
+    ],
+)
+def test_standardize_dates_parses_known_formats(raw):
+    load(d=[raw])
+    app.standardize_dates("d")
+    assert current()["d"].to_list() == ["2023-01-15"]
+
+
+def test_standardize_dates_fills_empty_and_keeps_unparseable():
+    load(d=["2023-01-15", None, "", "garbage"])
+    msg = app.standardize_dates("d")
+    today = datetime.now().strftime("%Y-%m-%d")
+    assert current()["d"].to_list() == ["2023-01-15", today, today, "garbage"]
+    assert "1 values in an unrecognized date format" in msg
+
+
+def test_standardize_dates_formats_temporal_column():
+    load(d=[datetime(2023, 1, 15), None])
+    app.standardize_dates("d", "%d/%m/%Y")
+    df = current()
+    assert df["d"].dtype == pl.String
+    assert df["d"].to_list() == ["15/01/2023", datetime.now().strftime("%d/%m/%Y")]
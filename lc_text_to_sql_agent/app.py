@@ -1,20 +1,20 @@
 # text_to_sql_agent.py
 
 import os
-import sqlite3
 import logging
 from typing import Dict, List, Any
 from dotenv import load_dotenv
 
 import pandas as pd
-import json
+import duckdb
+import orjson
 import streamlit as st
 
 from langchain_core.tools import StructuredTool
 from langchain_openai import AzureChatOpenAI
 from langchain.agents import create_openai_functions_agent, AgentExecutor
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.memory import ConversationBufferMemory
+from langchain.memory import ConversationSummaryBufferMemory
 from langchain_core.messages import AIMessage
 
 
@@ -66,21 +66,29 @@ logging.basicConfig(
 # Load Azure credentials
 load_dotenv()
 
-# --- SQLite / DB logic ---
+# --- DuckDB / DB logic ---
 if "conn" not in st.session_state:
     st.session_state.conn = None
     st.session_state.table_name = None
+    st.session_state.schema_json = None
 
 
-def load_csv_to_sqlite(file) -> Dict:
+def load_csv_to_duckdb(file) -> Dict:
     name = os.path.splitext(file.name)[0]
-    conn = sqlite3.connect(":memory:", check_same_thread=False)
-    df = pd.read_csv(file)
-    df.to_sql(name, conn, index=False, if_exists="replace")
+    # Arrow's multi-threaded CSV reader; DuckDB then queries the Arrow-backed frame
+    # in place as a view (no row inserts) with its vectorized engine
+    df = pd.read_csv(file, engine="pyarrow", dtype_backend="pyarrow")
+    conn = duckdb.connect()  # in-memory database
+    conn.register(name, df)
+    # The agent runs model-written SQL: no file/network reads (read_csv,
+    # read_text, ATTACH, ...) and no way for a query to turn that back on
+    conn.execute("SET enable_external_access=false")
+    conn.execute("SET lock_configuration=true")
     st.session_state.conn = conn
     st.session_state.table_name = name
+    st.session_state.schema_json = None  # re-read on next get_schema()
     nrows, ncols = df.shape
-    logging.info(f"Loaded CSV into SQLite table '{name}': {nrows} rows, {ncols} cols")
+    logging.info(f"Loaded CSV into DuckDB view '{name}': {nrows} rows, {ncols} cols")
     return {"table": name, "rows": nrows, "columns": ncols}
 
 
@@ -88,11 +96,15 @@ def get_schema() -> Dict:
     conn = st.session_state.conn
     if conn is None:
         return {"schema": ""}
-    cur = conn.execute("PRAGMA table_info(%s)" % st.session_state.table_name)
-    cols = [row[1] for row in cur.fetchall()]
-    schema = {st.session_state.table_name: cols}
-    # Return schema as JSON string to avoid non-string AIMessage content
-    return json.dumps({"schema": schema})
+    # The schema only changes on upload, so DESCRIBE runs once per table rather
+    # than on every rerun and every tool call
+    if st.session_state.schema_json is None:
+        rows = conn.execute('DESCRIBE "%s"' % st.session_state.table_name).fetchall()
+        cols = [row[0] for row in rows]
+        schema = {st.session_state.table_name: cols}
+        # Return schema as JSON string to avoid non-string AIMessage content
+        st.session_state.schema_json = orjson.dumps({"schema": schema}).decode()
+    return st.session_state.schema_json
 
 
 def execute_query(query: str) -> Dict:
@@ -102,16 +114,25 @@ def execute_query(query: str) -> Dict:
     q = query.strip().lower()
     if not q.startswith("select"):
         return {"error": "Only SELECT queries are allowed."}
+    try:
+        statements = duckdb.extract_statements(query)
+    except duckdb.Error as e:
+        return {"error": str(e)}
+    if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+        return {"error": "Only a single SELECT statement is allowed."}
     # enforce limit
     if "limit" not in q:
         query = query.rstrip(";") + " LIMIT 50;"
     else:
         query = query
     try:
-        df = pd.read_sql_query(query, conn)
-        rows = df.to_dict(orient="records")
+        # Only the first 50 rows are ever materialized into Python objects
+        res = conn.execute(query)
+        columns = [d[0] for d in res.description]
+        rows = [dict(zip(columns, r)) for r in res.fetchmany(50)]
         # Return query results as JSON string to avoid non-string AIMessage content
-        return json.dumps({"rows": rows, "columns": list(df.columns)})
+        # orjson encodes DATE/TIMESTAMP natively; default=str covers DECIMAL etc.
+        return orjson.dumps({"rows": rows, "columns": columns}, default=str).decode()
     except Exception as e:
         logging.error(f"Query failed: {e}")
         return {"error": str(e)}
@@ -135,21 +156,13 @@ execute_query_tool = StructuredTool.from_function(
 tools = [get_schema_tool, execute_query_tool]
 
 # --- Agent setup ---
-llm = AzureChatOpenAI(
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-12-01-preview"),
-    model=os.getenv("AZURE_OPENAI_MODEL_NAME"),
-    temperature=0,
-)
-
 prompt = ChatPromptTemplate.from_messages(
     [
         (
             "system",
             """You are an SQL assistant. Follow these steps for every question:
             1. Use get_schema() to learn the schema
-            2. Write and execute_query() to get data
+            2. Write and execute_query() to get data (DuckDB SQL dialect)
             3. Format the query results into a natural language response
             4. Always phrase your answer as a complete sentence, for example:
                - "There are 5 users who signed up in March 2025"
@@ -164,16 +177,40 @@ prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
 
-agent = create_openai_functions_agent(llm, tools, prompt)
-executor = AgentExecutor(
-    agent=agent,
-    tools=tools,
-    memory=memory,
-    verbose=True,
-    return_intermediate_steps=True,
-)
+@st.cache_resource
+def build_agent():
+    """LLM client and agent runnable hold no per-user state, so one per process."""
+    llm = AzureChatOpenAI(
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-12-01-preview"),
+        model=os.getenv("AZURE_OPENAI_MODEL_NAME"),
+        temperature=0,
+    )
+    return llm, create_openai_functions_agent(llm, tools, prompt)
+
+
+llm, agent = build_agent()
+
+# The executor owns the chat memory, so it is kept per browser session instead
+# of in the process-wide cache (users must not share one history).
+# Schemas and query results are verbose: older turns are folded into a running
+# summary once the history passes ~800 tokens
+if "executor" not in st.session_state:
+    st.session_state.executor = AgentExecutor(
+        agent=agent,
+        tools=tools,
+        memory=ConversationSummaryBufferMemory(
+            llm=llm,
+            memory_key="chat_history",
+            return_messages=True,
+            max_token_limit=800,
+        ),
+        verbose=False,
+        return_intermediate_steps=True,
+    )
+executor = st.session_state.executor
 
 # --- Streamlit UI ---
 st.set_page_config(page_title="Text‑to‑SQL Agent", layout="wide")
@@ -182,7 +219,7 @@ st.title("💬 Text‑to‑SQL Agent")
 uploaded = st.file_uploader("Upload a CSV file (single table)", type=["csv"])
 if uploaded:
     if st.session_state.conn is None or st.session_state.uploaded_name != uploaded.name:
-        summary = load_csv_to_sqlite(uploaded)
+        summary = load_csv_to_duckdb(uploaded)
         st.session_state.uploaded_name = uploaded.name
         st.success(
             f"Loaded table '{summary['table']}' with {summary['rows']} rows and {summary['columns']} columns."
@@ -190,7 +227,7 @@ if uploaded:
 
     schema_str = get_schema()
     try:
-        schema_dict = json.loads(schema_str)
+        schema_dict = orjson.loads(schema_str)
         schema = schema_dict["schema"]
     except Exception:
         schema = {}
@@ -0,0 +1,67 @@
+import io
+
+import duckdb
+import orjson
+import pytest
+
+import app
+
+
+@pytest.fixture(autouse=True)
+def people():
+    f = io.BytesIO(b"id,name\n1,ada\n2,alan\n3,grace\n")
+    f.name = "people.csv"
+    app.load_csv_to_duckdb(f)
+
+
+def test_select_returns_rows():
+    res = orjson.loads(app.execute_query("SELECT name FROM people ORDER BY id"))
+    assert res["columns"] == ["name"]
+    assert [r["name"] for r in res["rows"]] == ["ada", "alan", "grace"]
+
+
+def test_select_without_limit_is_capped_at_50():
+    res = orjson.loads(app.execute_query("SELECT * FROM range(100);"))
+    assert len(res["rows"]) == 50
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "DROP TABLE people",
+        "INSERT INTO people VALUES (4, 'x')",
+        "  delete from people",
+    ],
+)
+def test_non_select_is_rejected(query):
+    assert app.execute_query(query) == {"error": "Only SELECT queries are allowed."}
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "SELECT 1; DROP VIEW people",
+        "SELECT 1; SELECT 2",
+    ],
+)
+def test_stacked_statements_are_rejected(query):
+    assert app.execute_query(query) == {
+        "error": "Only a single SELECT statement is allowed."
+    }
+    assert (
+        app.st.session_state.conn.execute("SELECT count(*) FROM people").fetchone()[0]
+        == 3
+    )
+
+
+def test_unparseable_query_is_an_error():
+    assert "error" in app.execute_query("SELECT FROM WHERE")
+
+
+def test_file_reads_are_blocked():
+    assert "error" in app.execute_query("SELECT * FROM read_csv('/etc/passwd')")
+
+
+def test_sandbox_settings_are_locked():
+    with pytest.raises(duckdb.Error):
+        app.st.session_state.conn.execute("SET enable_external_access=true")
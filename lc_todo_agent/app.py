@@ -1,8 +1,9 @@
 import os
 import sqlite3
 import logging
+import threading
 from typing import Optional, List, Dict
-from datetime import datetime
+from datetime import datetime, UTC
 import streamlit as st
 from dotenv import load_dotenv
 
@@ -12,7 +13,7 @@ from langchain_core.tools import StructuredTool
 from langchain_openai import AzureChatOpenAI
 from langchain.agents import create_openai_functions_agent, AgentExecutor
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.memory import ConversationBufferMemory
+from langchain.memory import ConversationBufferWindowMemory
 from langchain_core.messages import (
     HumanMessage,
     AIMessage,
@@ -34,45 +35,51 @@ load_dotenv()
 
 # 📦 -- Database initialization --
 DB_PATH = os.path.join(os.path.dirname(__file__), "tasks.sqlite")
-_conn: sqlite3.Connection
 
 
-def _get_conn() -> sqlite3.Connection:
-    global _conn
+@st.cache_resource
+def _open_db():
+    """One WAL connection per process, plus the lock that serializes its use
+    across browser sessions; the schema is created once, here."""
     try:
-        if "_get_conn_conn" not in globals():
-            _conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-            _conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS tasks (
-                    id           INTEGER PRIMARY KEY AUTOINCREMENT,
-                    description  TEXT NOT NULL,
-                    created_at   TEXT NOT NULL,
-                    due_date     TEXT,
-                    completed_at TEXT
-                );
-                """
-            )
-            _conn.commit()
-        return _conn
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                id           INTEGER PRIMARY KEY AUTOINCREMENT,
+                description  TEXT NOT NULL,
+                created_at   TEXT NOT NULL,
+                due_date     TEXT,
+                completed_at TEXT
+            );
+            """
+        )
+        conn.commit()
+        return conn, threading.Lock()
     except Exception as e:
         logging.error(f"Error initializing DB connection: {e}")
         raise
 
 
+_CONN, _LOCK = _open_db()
+
+
 # ✅ -- Task functions --
 
 
 def add_task(description: str, due_date: Optional[str] = None) -> str:
     """Add a new task with optional due date (YYYY-MM-DD)."""
     try:
-        conn = _get_conn()
-        created = datetime.utcnow().isoformat()
-        cur = conn.execute(
-            "INSERT INTO tasks (description, created_at, due_date) VALUES (?, ?, ?)",
-            (description.strip(), created, due_date),
-        )
-        conn.commit()
+        created = datetime.now(UTC).isoformat()
+        with _LOCK:
+            cur = _CONN.execute(
+                "INSERT INTO tasks (description, created_at, due_date) VALUES (?, ?, ?)",
+                (description.strip(), created, due_date),
+            )
+            _CONN.commit()
         logging.info(f"Added task: {description} (Due: {due_date})")
         return f"Task #{cur.lastrowid} added."
     except Exception as e:
@@ -80,27 +87,39 @@ def add_task(description: str, due_date: Optional[str] = None) -> str:
         return f"Error adding task: {e}"
 
 
+def add_tasks_bulk(descriptions: List[str], due_date: Optional[str] = None) -> str:
+    """Add several tasks at once (one transaction), sharing an optional due date."""
+    try:
+        created = datetime.now(UTC).isoformat()
+        rows = [(d.strip(), created, due_date) for d in descriptions if d.strip()]
+        if not rows:
+            return "No tasks to add."
+        # Single BEGIN/COMMIT, so one fsync for the whole batch. The lock keeps
+        # other sessions' inserts out, and the open write transaction keeps
+        # other processes out, so the new ids are contiguous up to last_id
+        with _LOCK, _CONN:
+            _CONN.executemany(
+                "INSERT INTO tasks (description, created_at, due_date) VALUES (?, ?, ?)",
+                rows,
+            )
+            last_id = _CONN.execute("SELECT last_insert_rowid()").fetchone()[0]
+        first_id = last_id - len(rows) + 1
+        logging.info(f"Added {len(rows)} tasks in bulk (Due: {due_date})")
+        return f"Tasks #{first_id}–#{last_id} added."
+    except Exception as e:
+        logging.error(f"Error adding tasks: {e}")
+        return f"Error adding tasks: {e}"
+
+
 def list_tasks(only_incomplete: bool = False) -> List[Dict]:
     """Return full list of tasks; or incomplete ones if only_incomplete=True."""
     try:
-        conn = _get_conn()
+        sql = "SELECT id, description, created_at, due_date, completed_at FROM tasks"
         if only_incomplete:
-            rows = conn.execute(
-                "SELECT * FROM tasks WHERE completed_at IS NULL ORDER BY id"
-            ).fetchall()
-        else:
-            rows = conn.execute("SELECT * FROM tasks ORDER BY id").fetchall()
-        result = []
-        for id_, desc, created, due, comp in rows:
-            result.append(
-                {
-                    "id": id_,
-                    "description": desc,
-                    "created_at": created,
-                    "due_date": due,
-                    "completed_at": comp or None,
-                }
-            )
+            sql += " WHERE completed_at IS NULL"
+        # sqlite3.Row maps straight to the dict shape the tool and UI expect
+        with _LOCK:
+            result = [dict(r) for r in _CONN.execute(sql + " ORDER BY id")]
         logging.info(f"Listed {len(result)} tasks (only_incomplete={only_incomplete})")
         return result
     except Exception as e:
@@ -111,13 +130,13 @@ def list_tasks(only_incomplete: bool = False) -> List[Dict]:
 def complete_task(task_id: int) -> str:
     """Mark a task as completed by its numeric ID."""
     try:
-        conn = _get_conn()
-        now = datetime.utcnow().isoformat()
-        cur = conn.execute(
-            "UPDATE tasks SET completed_at = ? WHERE id = ? AND completed_at IS NULL",
-            (now, task_id),
-        )
-        conn.commit()
+        now = datetime.now(UTC).isoformat()
+        with _LOCK:
+            cur = _CONN.execute(
+                "UPDATE tasks SET completed_at = ? WHERE id = ? AND completed_at IS NULL",
+                (now, task_id),
+            )
+            _CONN.commit()
         if cur.rowcount:
             logging.info(f"Task #{task_id} marked complete.")
             return f"Task #{task_id} marked complete."
@@ -132,9 +151,9 @@ def complete_task(task_id: int) -> str:
 def delete_task(task_id: int) -> str:
     """Delete a task by its numeric ID."""
     try:
-        conn = _get_conn()
-        cur = conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
-        conn.commit()
+        with _LOCK:
+            cur = _CONN.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+            _CONN.commit()
         if cur.rowcount:
             logging.info(f"Task #{task_id} deleted.")
             return f"Task #{task_id} deleted."
@@ -155,6 +174,13 @@ add_task_tool = StructuredTool.from_function(
     return_direct=True,
 )
 
+add_tasks_bulk_tool = StructuredTool.from_function(
+    func=add_tasks_bulk,
+    name="add_tasks_bulk",
+    description="Add several tasks at once from a list of descriptions, with an optional shared due date (YYYY-MM-DD)",
+    return_direct=True,
+)
+
 list_tasks_tool = StructuredTool.from_function(
     func=list_tasks,
     name="list_tasks",
@@ -175,23 +201,22 @@ delete_task_tool = StructuredTool.from_function(
     return_direct=True,
 )
 
-tools = [add_task_tool, list_tasks_tool, complete_task_tool, delete_task_tool]
+tools = [
+    add_tasks_bulk_tool,
+    add_task_tool,
+    list_tasks_tool,
+    complete_task_tool,
+    delete_task_tool,
+]
 
 # 🧠 -- Agent + LLM setup --
 
-llm = AzureChatOpenAI(
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    api_version="2024-12-01-preview",
-    model=os.getenv("AZURE_OPENAI_MODEL_NAME"),
-    temperature=0,
-)
-
 prompt = ChatPromptTemplate.from_messages(
     [
         (
             "system",
-            "You are an intelligent to‑do list assistant. Use the tools to add, list, complete, or delete tasks.",
+            "You are an intelligent to‑do list assistant. Use the tools to add, list, complete, or delete tasks. "
+            "When the user lists several tasks to add, call add_tasks_bulk once instead of add_task per item.",
         ),
         MessagesPlaceholder("chat_history", optional=True),
         ("human", "{input}"),
@@ -199,17 +224,36 @@ prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
-
-agent_runnable = create_openai_functions_agent(llm, tools, prompt)
 
-agent_executor = AgentExecutor(
-    agent=agent_runnable,
-    tools=tools,
-    memory=memory,
-    verbose=True,
-    return_intermediate_steps=True,
-)
+@st.cache_resource
+def build_agent():
+    """LLM client and agent runnable hold no per-user state, so one per process."""
+    llm = AzureChatOpenAI(
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        api_version="2024-12-01-preview",
+        model=os.getenv("AZURE_OPENAI_MODEL_NAME"),
+        temperature=0,
+    )
+    return llm, create_openai_functions_agent(llm, tools, prompt)
+
+
+llm, agent_runnable = build_agent()
+
+# The executor owns the chat memory, so it is kept per browser session instead
+# of in the process-wide cache (users must not share one history).
+# Only the last 6 exchanges go back to the model, so prompt size stays bounded
+if "agent_executor" not in st.session_state:
+    st.session_state.agent_executor = AgentExecutor(
+        agent=agent_runnable,
+        tools=tools,
+        memory=ConversationBufferWindowMemory(
+            memory_key="chat_history", return_messages=True, k=6
+        ),
+        verbose=False,
+        return_intermediate_steps=True,
+    )
+agent_executor = st.session_state.agent_executor
 
 # 🖥️ -- Streamlit UI loop --
 
@@ -243,9 +287,12 @@ items = list_tasks(only_incomplete=False)
 if not items:
     st.write("_No tasks yet._")
 else:
+    # One table render instead of an st.write element per task
     for t in items:
-        comp = "✅ Done" if t["completed_at"] else "🔲 Pending"
-        due = f" (Due: {t['due_date']})" if t["due_date"] else ""
-        st.write(
-            f"- **{t['id']}**: {t['description']}{due} — *Created: {t['created_at']}* — *{comp}*"
-        )
+        t["status"] = "✅ Done" if t["completed_at"] else "🔲 Pending"
+    st.dataframe(
+        items,
+        column_order=["id", "description", "due_date", "created_at", "status"],
+        use_container_width=True,
+        hide_index=True,
+    )
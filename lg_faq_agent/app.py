@@ -1,8 +1,12 @@
 # faq_agent_langgraph.py
 
 import os
+import re
 import sqlite3
+import atexit
 import logging
+from logging.handlers import MemoryHandler
+import threading
 import json
 from pprint import pformat
 from typing import TypedDict, Dict, Any
@@ -18,10 +22,25 @@ import pandas as pd
 LOG_DIR = os.path.join(os.path.dirname(__file__), "logs")
 os.makedirs(LOG_DIR, exist_ok=True)
 LOG_FILE_PATH = os.path.join(LOG_DIR, "faq_agent.log")
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+
+
+@st.cache_resource
+def _buffered_log_file() -> MemoryHandler:
+    """Process-wide buffer in front of the log file: records are written in batches
+    of 1024 (immediately on ERROR, and at exit) instead of one write per line."""
+    file_handler = logging.FileHandler(LOG_FILE_PATH)
+    # The MemoryHandler hands raw records to its target, so it needs the format
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler = MemoryHandler(1024, flushLevel=logging.ERROR, target=file_handler)
+    atexit.register(handler.flush)
+    return handler
+
+
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[logging.FileHandler(LOG_FILE_PATH), logging.StreamHandler()],
+    format=LOG_FORMAT,
+    handlers=[_buffered_log_file(), logging.StreamHandler()],
 )
 
 # --------------- Load Environment Vars ---------------
@@ -35,30 +54,83 @@ AZURE_MODEL = os.getenv("AZURE_OPENAI_MODEL_NAME")
 DB_PATH = os.path.join(os.path.dirname(__file__), "faq.db")
 
 
+@st.cache_resource
+def _open_db():
+    """One autocommit WAL connection per process, so SQLite's page cache stays warm."""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-20000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn, threading.Lock()
+
+
+_CONN, _LOCK = _open_db()
+
+
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
+    with _LOCK:
+        cur = _CONN.cursor()
+        fts_exists = cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='faqs_fts'"
+        ).fetchone()
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS faqs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                question TEXT,
+                answer TEXT
+            )
         """
-        CREATE TABLE IF NOT EXISTS faqs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            question TEXT,
-            answer TEXT
         )
-    """
-    )
-    cur.execute(
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS feedback (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                question TEXT,
+                answer TEXT,
+                feedback TEXT
+            )
         """
-        CREATE TABLE IF NOT EXISTS feedback (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            question TEXT,
-            answer TEXT,
-            feedback TEXT
         )
-    """
-    )
-    conn.commit()
-    conn.close()
+        # Case-insensitive index backing the exact-match fast path in search_faq_node
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_faqs_question_nocase "
+            "ON faqs(question COLLATE NOCASE)"
+        )
+        # FTS5 index over the FAQs (external-content table kept in sync by triggers)
+        cur.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS faqs_fts USING fts5(
+                question,
+                answer,
+                tokenize='unicode61',
+                content='faqs',
+                content_rowid='id'
+            )
+        """
+        )
+        cur.executescript(
+            """
+            CREATE TRIGGER IF NOT EXISTS faqs_ai AFTER INSERT ON faqs BEGIN
+                INSERT INTO faqs_fts(rowid, question, answer)
+                VALUES (new.id, new.question, new.answer);
+            END;
+            CREATE TRIGGER IF NOT EXISTS faqs_ad AFTER DELETE ON faqs BEGIN
+                INSERT INTO faqs_fts(faqs_fts, rowid, question, answer)
+                VALUES ('delete', old.id, old.question, old.answer);
+            END;
+            CREATE TRIGGER IF NOT EXISTS faqs_au AFTER UPDATE ON faqs BEGIN
+                INSERT INTO faqs_fts(faqs_fts, rowid, question, answer)
+                VALUES ('delete', old.id, old.question, old.answer);
+                INSERT INTO faqs_fts(rowid, question, answer)
+                VALUES (new.id, new.question, new.answer);
+            END;
+        """
+        )
+        if not fts_exists:
+            # Index any FAQ rows that predate the FTS table
+            cur.execute("INSERT INTO faqs_fts(faqs_fts) VALUES ('rebuild')")
 
 
 init_db()
@@ -89,30 +161,41 @@ SAMPLE_FAQS = [
 
 
 def seed_faqs():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    for q, a in SAMPLE_FAQS:
-        cur.execute("INSERT INTO faqs (question, answer) VALUES (?, ?)", (q, a))
-    conn.commit()
-    conn.close()
+    with _LOCK:
+        # One transaction (and one WAL commit) for the whole batch
+        _CONN.execute("BEGIN")
+        try:
+            _CONN.executemany(
+                "INSERT INTO faqs (question, answer) VALUES (?, ?)", SAMPLE_FAQS
+            )
+            _CONN.execute("COMMIT")
+        except Exception:
+            _CONN.execute("ROLLBACK")
+            raise
 
 
 # Only seed if no data
-conn = sqlite3.connect(DB_PATH)
-count = conn.execute("SELECT COUNT(*) FROM faqs").fetchone()[0]
-conn.close()
+with _LOCK:
+    count = _CONN.execute("SELECT COUNT(*) FROM faqs").fetchone()[0]
 if count == 0:
     seed_faqs()
     logging.info("Seeded sample FAQ data.")
 
+
 # --------------- LLM Setup ---------------
-llm = AzureChatOpenAI(
-    azure_endpoint=AZURE_ENDPOINT,
-    api_key=AZURE_API_KEY,
-    api_version=AZURE_API_VERSION,
-    model=AZURE_MODEL,
-    temperature=0,
-)
+@st.cache_resource
+def build_llm() -> AzureChatOpenAI:
+    """One client (and HTTP connection pool) per process, not one per rerun."""
+    return AzureChatOpenAI(
+        azure_endpoint=AZURE_ENDPOINT,
+        api_key=AZURE_API_KEY,
+        api_version=AZURE_API_VERSION,
+        model=AZURE_MODEL,
+        temperature=0,
+    )
+
+
+llm = build_llm()
 
 
 # --------------- Define State Schema ---------------
@@ -128,14 +211,46 @@ class State(TypedDict, total=False):
 # --------------- Node Functions ---------------
 
 
+def build_match_query(question: str) -> str:
+    """Turn free text into an FTS5 query requiring every word as a prefix,
+    e.g. 'Is LangGraph free?' -> 'question : ("is"* "langgraph"* "free"*)'."""
+    tokens = re.findall(r"\w+", question.lower())
+    if not tokens:
+        return ""
+    return "question : (" + " ".join(f'"{t}"*' for t in tokens) + ")"
+
+
 def search_faq_node(state: State) -> State:
     try:
         q = state.get("question", "")
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        cur.execute("SELECT answer FROM faqs WHERE question LIKE ?", (f"%{q}%",))
-        res = cur.fetchone()
-        conn.close()
+        match = build_match_query(q)
+        with _LOCK:
+            # A repeat of a stored question is an index seek; FTS only on a miss
+            res = _CONN.execute(
+                "SELECT answer FROM faqs WHERE question = ? COLLATE NOCASE LIMIT 1",
+                (q.strip(),),
+            ).fetchone()
+            if res is None and match:
+                try:
+                    # Index lookup ranked by BM25 on the question column (answer weight 0)
+                    res = _CONN.execute(
+                        "SELECT answer FROM faqs_fts WHERE faqs_fts MATCH ? "
+                        "ORDER BY bm25(faqs_fts, 1.0, 0.0) LIMIT 1",
+                        (match,),
+                    ).fetchone()
+                except sqlite3.OperationalError as e:
+                    logging.warning(
+                        f"FTS query failed, falling back to substring search: {e}"
+                    )
+            if res is None:
+                # Substring test, as the original LIKE '%q%' did, for what token
+                # prefixes miss (e.g. "chain" inside "LangChain"); instr() skips
+                # LIKE's wildcard matcher
+                res = _CONN.execute(
+                    "SELECT answer FROM faqs "
+                    "WHERE instr(lower(question), lower(?)) > 0 LIMIT 1",
+                    (q,),
+                ).fetchone()
         if res:
             state["answer"] = res[0]
             state["found"] = True
@@ -164,7 +279,7 @@ def generate_answer_node(state: State) -> State:
             SystemMessage(content="You are a helpful assistant."),
             HumanMessage(content=f"Please answer the following question:\n'{q}'"),
         ]
-        response = llm(messages)
+        response = llm.invoke(messages)
         state["answer"] = response.content
         logging.info("Generated fallback answer via LLM.")
         step_info = {
@@ -195,6 +310,11 @@ def feedback_node(state: State) -> State:
 
 # --------------- Build LangGraph Workflow ---------------
 
+
+def route_after_search(state: State) -> str:
+    return "feedback" if state.get("found") else "generate_answer"
+
+
 workflow = StateGraph(state_schema=State)
 workflow.add_node("search_faq", search_faq_node)
 workflow.add_node("generate_answer", generate_answer_node)
@@ -202,14 +322,35 @@ workflow.add_node("feedback", feedback_node)
 
 # Conditional branching based on FAQ match
 workflow.add_edge(START, "search_faq")
+# Explicit path map: the branch targets are declared (and checked at compile time)
 workflow.add_conditional_edges(
-    "search_faq", lambda state: "feedback" if state.get("found") else "generate_answer"
+    "search_faq",
+    route_after_search,
+    {"feedback": "feedback", "generate_answer": "generate_answer"},
 )
 workflow.add_edge("generate_answer", "feedback")
 workflow.add_edge("feedback", END)
 
 faq_agent = workflow.compile()
 
+
+class _FailedRun(Exception):
+    """Carries an errored graph result out of answer_question so it isn't cached."""
+
+    def __init__(self, result: State):
+        super().__init__(result.get("error"))
+        self.result = result
+
+
+@st.cache_data(ttl=3600, max_entries=1024, show_spinner=False)
+def answer_question(q: str) -> State:
+    """Run the graph for a question; repeat questions skip SQLite and the LLM."""
+    result = faq_agent.invoke({"question": q, "steps": []})
+    if "error" in result:
+        raise _FailedRun(result)
+    return result
+
+
 # --------------- Streamlit UI ---------------
 st.set_page_config(page_title="LangGraph FAQ Bot", layout="wide")
 st.title("📚 FAQ Bot with Feedback")
@@ -225,8 +366,10 @@ if st.button("Submit Query"):
         st.warning("Please enter a question.")
     else:
         st.session_state.question = query
-        init_state: State = {"question": query, "steps": []}
-        st.session_state.result = faq_agent.invoke(init_state)
+        try:
+            st.session_state.result = answer_question(query)
+        except _FailedRun as e:
+            st.session_state.result = e.result
         st.session_state.llm_answer = None
 
 if st.session_state.result:
@@ -248,18 +391,15 @@ if st.session_state.result:
             if result.get("persist_feedback"):
                 # Perform DB write here
                 try:
-                    conn = sqlite3.connect(DB_PATH)
-                    cur = conn.cursor()
-                    cur.execute(
-                        "INSERT INTO feedback (question, answer, feedback) VALUES (?, ?, ?)",
-                        (
-                            result.get("question"),
-                            result.get("answer"),
-                            result.get("feedback"),
-                        ),
-                    )
-                    conn.commit()
-                    conn.close()
+                    with _LOCK:
+                        _CONN.execute(
+                            "INSERT INTO feedback (question, answer, feedback) VALUES (?, ?, ?)",
+                            (
+                                result.get("question"),
+                                result.get("answer"),
+                                result.get("feedback"),
+                            ),
+                        )
                     logging.info("Feedback stored (from UI).")
                 except Exception as e:
                     st.error(f"Feedback DB error: {e}")
@@ -269,7 +409,6 @@ if st.session_state.result:
                     "answer", "_No answer provided_"
                 )
             else:
-                faq_agent.invoke(result)
                 st.success("Thank you for your feedback!")
 
     if st.session_state.llm_answer:
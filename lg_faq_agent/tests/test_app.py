@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+
+import app
+
+LANGCHAIN = app.SAMPLE_FAQS[0][1]
+LANGGRAPH_FREE = app.SAMPLE_FAQS[4][1]
+
+
+@pytest.fixture(autouse=True)
+def faq_db(tmp_path, monkeypatch):
+    """A freshly seeded database per test instead of the app's faq.db."""
+    conn = sqlite3.connect(tmp_path / "faq.db", isolation_level=None)
+    monkeypatch.setattr(app, "_CONN", conn)
+    app.init_db()
+    app.seed_faqs()
+    yield
+    conn.close()
+
+
+def search(question: str) -> dict:
+    return app.search_faq_node({"question": question})
+
+
+def test_build_match_query_requires_every_word_as_prefix():
+    assert (
+        app.build_match_query("Is LangGraph free?")
+        == 'question : ("is"* "langgraph"* "free"*)'
+    )
+
+
+def test_build_match_query_strips_fts_syntax():
+    assert app.build_match_query('"NEAR" (OR) *') == 'question : ("near"* "or"*)'
+    assert app.build_match_query("?!") == ""
+
+
+def test_exact_question_is_found_case_insensitively():
+    state = search("what is langchain?")
+    assert state["found"] is True
+    assert state["answer"] == LANGCHAIN
+
+
+def test_partial_question_hits_fts():
+    state = search("is langgraph free")
+    assert state["found"] is True
+    assert state["answer"] == LANGGRAPH_FREE
+
+
+def test_substring_inside_a_word_falls_back_to_instr():
+    state = search("graph free")
+    assert state["found"] is True
+    assert state["answer"] == LANGGRAPH_FREE
+
+
+def test_unrelated_question_misses():
+    state = search("How do I bake bread?")
+    assert state["found"] is False
+    assert "answer" not in state
+    assert "error" not in state
@@ -1,28 +1,55 @@
 # micro_tutor_langgraph.py
 
 import os
+import re
+import uuid
+import ast
 import json
+import math
+import random
+import atexit
 import logging
-from typing import TypedDict, Dict, Any, List
+from logging.handlers import MemoryHandler
+from collections import deque
+from functools import lru_cache
+from operator import itemgetter
+from typing import TypedDict, Dict, Any, List, Optional
 from dotenv import load_dotenv
 
 import streamlit as st
+from pydantic import BaseModel, Field
 from langgraph.graph import StateGraph, START, END
+from langgraph.checkpoint.memory import InMemorySaver
 from langchain_openai import AzureChatOpenAI
 from langchain_core.messages import (
     SystemMessage,
     HumanMessage,
 )
+from langchain_core.runnables import RunnableParallel
 
 # -------------------- Logging --------------------
 
 LOG_DIR = os.path.join(os.path.dirname(__file__), "logs")
 os.makedirs(LOG_DIR, exist_ok=True)
 LOG_FILE_PATH = os.path.join(LOG_DIR, "micro_tutor.log")
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+
+
+@st.cache_resource
+def _buffered_log_file() -> MemoryHandler:
+    """Buffers file logging (flushed per 1024 records, on ERROR and at exit)."""
+    file_handler = logging.FileHandler(LOG_FILE_PATH)
+    # The MemoryHandler hands raw records to its target, so it needs the format
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler = MemoryHandler(1024, flushLevel=logging.ERROR, target=file_handler)
+    atexit.register(handler.flush)
+    return handler
+
+
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[logging.FileHandler(LOG_FILE_PATH), logging.StreamHandler()],
+    format=LOG_FORMAT,
+    handlers=[_buffered_log_file(), logging.StreamHandler()],
 )
 
 # -------------------- Azure OpenAI --------------------
@@ -32,12 +59,36 @@ AZURE_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 AZURE_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-12-01-preview")
 AZURE_MODEL = os.getenv("AZURE_OPENAI_MODEL_NAME")
 
-llm = AzureChatOpenAI(
-    azure_endpoint=AZURE_ENDPOINT,
-    api_key=AZURE_API_KEY,
-    api_version=AZURE_API_VERSION,
-    model=AZURE_MODEL,
-    temperature=0,
+
+class GraderOut(BaseModel):
+    is_correct: bool = Field(description="Whether the student's answer is correct")
+    brief_reason: str = Field(description="Why, in 20 words or fewer")
+
+
+@st.cache_resource
+def build_llms():
+    """Tutor client, a higher-temperature one for question variety, and the typed
+    grader, built once per process instead of on every rerun or new question."""
+    azure = dict(
+        azure_endpoint=AZURE_ENDPOINT,
+        api_key=AZURE_API_KEY,
+        api_version=AZURE_API_VERSION,
+        model=AZURE_MODEL,
+    )
+    tutor = AzureChatOpenAI(**azure, temperature=0)
+    varied = AzureChatOpenAI(**azure, temperature=0.7)
+    # Function calling returns the verdict as typed arguments; include_raw keeps a
+    # malformed reply from raising (parsed is None instead)
+    grader = tutor.with_structured_output(
+        GraderOut, method="function_calling", include_raw=True
+    )
+    return tutor, varied, grader
+
+
+llm, varied_llm, grader = build_llms()
+# Runs the grader and the hint prompt on their own message lists concurrently
+grade_and_hint = RunnableParallel(
+    grade=itemgetter("grade") | grader, hint=itemgetter("hint") | llm
 )
 
 
@@ -47,11 +98,14 @@ class State(TypedDict, total=False):
     learner_id: str
     topic: str
     question: str
+    expected: float  # canonical answer, when the question was generated locally
     user_answer: str
 
     # Control
     attempts: int
     is_correct: bool
+    brief_reason: str
+    next_hint: str  # fetched alongside the grade, used by give_hint
 
     # Outputs
     hint_history: List[str]
@@ -61,40 +115,122 @@ class State(TypedDict, total=False):
     error: str
 
 
+# -------------------- Arithmetic fast path --------------------
+# Runs of digits, operators, parentheses and spaces, e.g. "7 + 5" in "What is 7 + 5?"
+EXPR_RE = re.compile(r"[-+*/()\d\s.]+")
+THOUSANDS_RE = re.compile(r"(?<=\d),(?=\d{3}\b)")
+NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+_BIN_OPS = {
+    ast.Add: lambda a, b: a + b,
+    ast.Sub: lambda a, b: a - b,
+    ast.Mult: lambda a, b: a * b,
+    ast.Div: lambda a, b: a / b,
+}
+
+
+def _eval_node(node: ast.AST) -> float:
+    """Evaluate a parsed expression, allowing only numbers and + - * / (no eval())."""
+    if isinstance(node, ast.Expression):
+        return _eval_node(node.body)
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return node.value
+    if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+        return _BIN_OPS[type(node.op)](_eval_node(node.left), _eval_node(node.right))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+        value = _eval_node(node.operand)
+        return -value if isinstance(node.op, ast.USub) else value
+    raise ValueError(f"unsupported expression: {ast.dump(node)}")
+
+
+def _try_compute(question: str) -> Optional[float]:
+    """Value of the single arithmetic expression in the question, or None when
+    there isn't exactly one (word problems, percentages, ...)."""
+    text = question.replace("×", "*").replace("÷", "/")
+    text = THOUSANDS_RE.sub("", text)  # "1,000" -> "1000"
+    candidates = [
+        m.strip()
+        for m in EXPR_RE.findall(text)
+        if any(c.isdigit() for c in m) and any(c in "+-*/" for c in m.strip()[1:])
+    ]
+    if len(candidates) != 1:
+        return None
+    try:
+        return float(_eval_node(ast.parse(candidates[0], mode="eval")))
+    except (SyntaxError, ValueError, ZeroDivisionError):
+        return None
+
+
+def _gen_arithmetic_batch(n: int = 50) -> List[tuple]:
+    """n distinct (question, answer) pairs built with random; division is always exact."""
+    pool = {}
+    while len(pool) < n:
+        op = random.choice("+-×÷")
+        if op == "+":
+            a, b = random.randint(1, 50), random.randint(1, 50)
+            ans = a + b
+        elif op == "-":
+            a = random.randint(1, 50)
+            b = random.randint(1, a)
+            ans = a - b
+        elif op == "×":
+            a, b = random.randint(2, 12), random.randint(2, 12)
+            ans = a * b
+        else:
+            b, ans = random.randint(2, 12), random.randint(2, 12)
+            a = b * ans
+        pool[f"What is {a} {op} {b}?"] = float(ans)
+    return list(pool.items())
+
+
+def _parse_number(answer: str) -> Optional[float]:
+    m = NUMBER_RE.fullmatch(answer.strip().replace(",", ""))
+    return float(m.group()) if m else None
+
+
 # -------------------- Nodes --------------------
+# Fixed system prompts, built once rather than per LLM call
+SYS_GRADER = SystemMessage(
+    content="You are a concise math grader. Judge the student's answer to the following arithmetic question."
+)
+SYS_HINT = SystemMessage(
+    content=(
+        "You are a math tutor. Give ONE short hint (max 1 sentence) for the following arithmetic question. "
+        "Do NOT reveal the final answer. Keep it actionable."
+    )
+)
+SYS_EXPLAIN = SystemMessage(
+    content=(
+        "You are a math tutor. Provide a concise worked solution in <=3 steps for the following arithmetic question, "
+        "then state the final answer."
+    )
+)
+SYS_PRAISE = SystemMessage(
+    content="You are a supportive tutor. Reply with 1 sentence: praise + key takeaway for the following arithmetic question."
+)
+
+TURN_OUTPUTS = (
+    "is_correct",
+    "brief_reason",
+    "next_hint",
+    "final_explanation",
+    "praise",
+    "error",
+)
+
+
 def select_item(state: State) -> State:
     """Choose the current item based on session index and topic."""
     try:
-        topic = state.get("topic") or "arithmetic"
-        # Only arithmetic supported for now
-        if "question" not in st.session_state or st.session_state.get(
-            "new_question", True
-        ):
-            prev_qs = st.session_state.previous_questions
-            prompt = (
-                "You are a math tutor. Generate a single arithmetic question for practice. "
-                "Do not repeat any of these previous questions: "
-                f"{prev_qs}. Return only the question as a string."
-            )
-            sys = SystemMessage(content=prompt)
-            # Use higher temperature for more variety
-            varied_llm = AzureChatOpenAI(
-                azure_endpoint=AZURE_ENDPOINT,
-                api_key=AZURE_API_KEY,
-                api_version=AZURE_API_VERSION,
-                model=AZURE_MODEL,
-                temperature=0.7,
-            )
-            ai = varied_llm.invoke([sys])
-            question = ai.content.strip()
-            st.session_state.question = question
-            st.session_state.new_question = False
-            # Track previous questions
-            st.session_state.previous_questions.append(question)
-
+        # The UI generates each question exactly once (guarded by new_question);
+        # this node only picks up the current one
         state["question"] = st.session_state.question
+        state["expected"] = st.session_state.get("expected")
+        # attempts/hint_history carry over between submissions via the checkpoint;
+        # the previous turn's outputs must not
         state.setdefault("attempts", 0)
         state.setdefault("hint_history", [])
+        for key in TURN_OUTPUTS:
+            state[key] = None
         logging.info(f"Selected question: {state['question']}")
     except Exception as e:
         state["error"] = f"select_item error: {e}"
@@ -102,25 +238,74 @@ def select_item(state: State) -> State:
     return state
 
 
+# Prompts depend only on the question (and answer), which repeat across attempts
+# and reruns; memoized as tuples so a cached prompt can't be mutated in place
+@lru_cache(maxsize=256)
+def _grader_msgs(question: str, student: str) -> tuple:
+    human = HumanMessage(
+        content=json.dumps({"question": question, "student_answer": student})
+    )
+    return (SYS_GRADER, human)
+
+
+@lru_cache(maxsize=256)
+def _hint_msgs(question: str, student: str) -> tuple:
+    human = HumanMessage(content=f"Question: {question}\nStudent answer: {student}")
+    return (SYS_HINT, human)
+
+
+@lru_cache(maxsize=256)
+def _explain_msgs(question: str) -> tuple:
+    return (SYS_EXPLAIN, HumanMessage(content=f"Question: {question}"))
+
+
+@lru_cache(maxsize=256)
+def _praise_msgs(question: str) -> tuple:
+    return (SYS_PRAISE, HumanMessage(content=f"Question: {question}"))
+
+
+def _grader_messages(state: State) -> tuple:
+    student = (state.get("user_answer") or "").strip()
+    return _grader_msgs(state.get("question", ""), student)
+
+
+def _hint_messages(state: State) -> tuple:
+    student = (state.get("user_answer") or "").strip()
+    return _hint_msgs(state.get("question", ""), student)
+
+
 def check_answer(state: State) -> State:
-    """Ask the model to judge correctness concisely using the canonical answer."""
+    """Grade the answer: in Python for plain arithmetic, otherwise by the model."""
     try:
-        question = state.get("question", "")
-        student = (state.get("user_answer") or "").strip()
-        sys = SystemMessage(
-            content=(
-                "You are a concise math grader. Judge the student's answer to the following arithmetic question. "
-                "Return JSON ONLY with keys: is_correct (true/false), brief_reason (<=20 words)."
+        expected = state.get("expected")
+        if expected is None:
+            expected = _try_compute(state.get("question", ""))
+        student = _parse_number(state.get("user_answer") or "")
+        if expected is not None and student is not None:
+            # Plain arithmetic with a numeric answer: grade locally, no LLM call.
+            # A wrong answer gets its hint from give_hint as usual.
+            state["is_correct"] = math.isclose(student, expected, abs_tol=0.01)
+            state["brief_reason"] = (
+                "That's the right result."
+                if state["is_correct"]
+                else "That's not the right result."
             )
-        )
-        human = HumanMessage(
-            content=json.dumps({"question": question, "student_answer": student})
-        )
-        ai = llm.invoke([sys, human])
-        parsed = {}
-        try:
-            parsed = json.loads(ai.content)
-        except Exception:
+            logging.info(f"Graded locally: expected {expected}, got {student}.")
+            return state
+        if int(state.get("attempts", 0)) < 2:
+            # The hint doesn't depend on the verdict, so request it concurrently
+            # with the grade; it is simply unused when the answer is correct
+            out = grade_and_hint.invoke(
+                {"grade": _grader_messages(state), "hint": _hint_messages(state)}
+            )
+            graded = out["grade"]
+            state["next_hint"] = out["hint"].content.strip()
+        else:
+            # Out of hint attempts: a wrong answer goes straight to explain
+            graded = grader.invoke(_grader_messages(state))
+        if graded["parsed"] is not None:
+            parsed = graded["parsed"].model_dump()
+        else:
             parsed = {
                 "is_correct": False,
                 "brief_reason": "Could not parse LLM response.",
@@ -137,17 +322,8 @@ def check_answer(state: State) -> State:
 def give_hint(state: State) -> State:
     """Generate a short hint (1 sentence) without revealing the full solution."""
     try:
-        question = state.get("question", "")
-        student = (state.get("user_answer") or "").strip()
-        sys = SystemMessage(
-            content=(
-                "You are a math tutor. Give ONE short hint (max 1 sentence) for the following arithmetic question. "
-                "Do NOT reveal the final answer. Keep it actionable."
-            )
-        )
-        human = HumanMessage(content=f"Question: {question}\nStudent answer: {student}")
-        ai = llm.invoke([sys, human])
-        hint = ai.content.strip()
+        hint = state.get("next_hint") or llm.invoke(_hint_messages(state)).content
+        hint = hint.strip()
         state["hint_history"] = (state.get("hint_history") or []) + [hint]
         state["attempts"] = int(state.get("attempts", 0)) + 1
         logging.info(f"Hint generated. Attempts now {state['attempts']}.")
@@ -160,15 +336,7 @@ def give_hint(state: State) -> State:
 def explain(state: State) -> State:
     """Give a concise worked solution referencing the canonical answer."""
     try:
-        question = state.get("question", "")
-        sys = SystemMessage(
-            content=(
-                "You are a math tutor. Provide a concise worked solution in <=3 steps for the following arithmetic question, "
-                "then state the final answer."
-            )
-        )
-        human = HumanMessage(content=f"Question: {question}")
-        ai = llm.invoke([sys, human])
+        ai = llm.invoke(_explain_msgs(state.get("question", "")))
         state["final_explanation"] = ai.content.strip()
         logging.info("Final explanation generated.")
     except Exception as e:
@@ -180,12 +348,7 @@ def explain(state: State) -> State:
 def summarize_success(state: State) -> State:
     """Brief praise + key point when correct."""
     try:
-        question = state.get("question", "")
-        sys = SystemMessage(
-            content="You are a supportive tutor. Reply with 1 sentence: praise + key takeaway for the following arithmetic question."
-        )
-        human = HumanMessage(content=f"Question: {question}")
-        ai = llm.invoke([sys, human])
+        ai = llm.invoke(_praise_msgs(state.get("question", "")))
         state["praise"] = ai.content.strip()
         logging.info("Success summary generated.")
     except Exception as e:
@@ -230,7 +393,17 @@ workflow.add_edge("summarize_success", END)
 workflow.add_edge("give_hint", END)  # UI will gather a new attempt and re-run
 workflow.add_edge("explain", END)
 
-tutor_app = workflow.compile()
+
+@st.cache_resource
+def build_tutor_app():
+    """Compile once with an in-memory checkpointer: each item's attempts and hints
+    are kept by LangGraph under its thread_id instead of mirrored in session state.
+    The learner id lives in session state, so this state is per browser session
+    and is gone after a refresh or a server restart."""
+    return workflow.compile(checkpointer=InMemorySaver())
+
+
+tutor_app = build_tutor_app()
 
 # -------------------- Streamlit UI --------------------
 st.set_page_config(page_title="🧮 Math-Tutor (LangGraph)", layout="wide")
@@ -241,14 +414,15 @@ if "topic" not in st.session_state:
     st.session_state.topic = "arithmetic"
 if "item_index" not in st.session_state:
     st.session_state.item_index = 0
-if "attempts" not in st.session_state:
-    st.session_state.attempts = 0
-if "hint_history" not in st.session_state:
-    st.session_state.hint_history = []
+if "learner_id" not in st.session_state:
+    st.session_state.learner_id = uuid.uuid4().hex
 if "show_next" not in st.session_state:
     st.session_state.show_next = False
 if "previous_questions" not in st.session_state:
-    st.session_state.previous_questions = []
+    # Only the last 20 questions are remembered (and sent to the prompt); the set
+    # mirrors the deque for O(1) repeat checks
+    st.session_state.previous_questions = deque(maxlen=20)
+    st.session_state.previous_set = set()
 
 col1, col2 = st.columns([2, 1])
 with col1:
@@ -256,27 +430,37 @@ with col1:
     # Current question
     if "question" not in st.session_state or st.session_state.get("new_question", True):
         st.session_state.new_question = True
-        prev_qs = st.session_state.previous_questions
-        prompt = (
-            "You are a math tutor. Generate a single arithmetic question for practice. "
-            "Do not repeat any of these previous questions: "
-            f"{prev_qs}. Return only the question as a string."
-        )
-        sys = SystemMessage(content=prompt)
-        # Use higher temperature for more variety
-        varied_llm = AzureChatOpenAI(
-            azure_endpoint=AZURE_ENDPOINT,
-            api_key=AZURE_API_KEY,
-            api_version=AZURE_API_VERSION,
-            model=AZURE_MODEL,
-            temperature=0.7,
-        )
-        ai = varied_llm.invoke([sys])
-        question = ai.content.strip()
+        if st.session_state.topic == "arithmetic":
+            # Arithmetic items come from a locally generated pool: no LLM round trip
+            while True:
+                if not st.session_state.get("question_pool"):
+                    st.session_state.question_pool = _gen_arithmetic_batch()
+                question, expected = st.session_state.question_pool.pop()
+                if question not in st.session_state.previous_set:
+                    break
+        else:
+            prev_qs = list(st.session_state.previous_questions)
+            prompt = (
+                f"You are a math tutor. Generate a single {st.session_state.topic} question for practice. "
+                "Do not repeat any of these previous questions: "
+                f"{prev_qs}. Return only the question as a string."
+            )
+            sys = SystemMessage(content=prompt)
+            for _ in range(3):  # regenerate (at most twice) on a repeat
+                # Higher-temperature client for more variety
+                ai = varied_llm.invoke([sys])
+                question, expected = ai.content.strip(), None
+                if question not in st.session_state.previous_set:
+                    break
         st.session_state.question = question
+        st.session_state.expected = expected
         st.session_state.new_question = False
-        # Track previous questions
-        st.session_state.previous_questions.append(question)
+        # Track previous questions, keeping the set in step with the bounded deque
+        prev = st.session_state.previous_questions
+        if len(prev) == prev.maxlen:
+            st.session_state.previous_set.discard(prev[0])
+        prev.append(question)
+        st.session_state.previous_set.add(question)
     st.markdown(f"### Question\n{st.session_state.question}")
 
     # Generate a unique key for the text input to force it to reset
@@ -285,13 +469,21 @@ with col1:
     user_answer = st.text_input(
         "Your answer ", key=f"answer_{st.session_state.answer_key}"
     )
+    # One checkpoint thread per learner and item
+    config = {
+        "configurable": {
+            "thread_id": f"{st.session_state.learner_id}:{st.session_state.item_index}"
+        }
+    }
+    item_state = tutor_app.get_state(config).values
+    attempts = int(item_state.get("attempts") or 0)
     # Display current attempts and hints if any
-    if st.session_state.attempts > 0:
-        st.write(f"Attempts (this item): **{st.session_state.attempts}**")
-        if st.session_state.hint_history:
+    if attempts > 0:
+        st.write(f"Attempts (this item): **{attempts}**")
+        if item_state.get("hint_history"):
             st.markdown("**Hints so far:**")
-            for idx, hint in enumerate(st.session_state.hint_history, 1):
-                st.write(f"{idx}. {hint}")
+            for idx, hint in enumerate(item_state["hint_history"], 1):
+                st.write(f"{idx}. {hint.replace('Hint: ', '')}")
 
     submit = st.button("Submit")
 
@@ -318,8 +510,6 @@ with col1:
                 del st.session_state["question"]
             if "last_result" in st.session_state:
                 del st.session_state["last_result"]
-            st.session_state.attempts = 0
-            st.session_state.hint_history = []
             st.session_state.show_next = False
             st.session_state.item_index += 1
             if "answer_key" not in st.session_state:
@@ -329,14 +519,12 @@ with col1:
 
     if submit:
         init_state: State = {
-            "learner_id": "demo",
+            "learner_id": st.session_state.learner_id,
             "topic": st.session_state.topic,
             "question": st.session_state.question,
             "user_answer": user_answer,
-            "attempts": st.session_state.attempts,
-            "hint_history": st.session_state.hint_history,
         }
-        result = tutor_app.invoke(init_state)
+        result = tutor_app.invoke(init_state, config=config)
 
         if result.get("error"):
             st.error(result["error"])
@@ -367,14 +555,9 @@ with col1:
                     latest_hint = hints[-1].replace("Hint: ", "") if hints else None
                     st.session_state.last_result = {
                         "type": "hint",
-                        "message": f"❌ Attempt {st.session_state.attempts + 1}: {brief_reason}",
+                        "message": f"❌ Attempt {attempts + 1}: {brief_reason}",
                         "hint": latest_hint,
                     }
-                    # Update attempts and hint_history
-                    st.session_state.attempts = int(result.get("attempts", 0))
-                    st.session_state.hint_history = [
-                        h.replace("Hint: ", "") for h in hints
-                    ]
             # Add st.rerun() here to ensure UI updates before user can interact further
             st.rerun()
 
@@ -0,0 +1,71 @@
+import ast
+
+import pytest
+
+import app
+
+
+def evaluate(expr: str) -> float:
+    return app._eval_node(ast.parse(expr, mode="eval"))
+
+
+@pytest.mark.parametrize(
+    "expr, expected",
+    [
+        ("3 + 4", 7),
+        ("10 - 2 * 3", 4),
+        ("(10 - 2) * 3", 24),
+        ("84 / 12", 7),
+        ("-5 + +2", -3),
+        ("1.5 * 4", 6),
+    ],
+)
+def test_eval_node_arithmetic(expr, expected):
+    assert evaluate(expr) == expected
+
+
+@pytest.mark.parametrize(
+    "expr",
+    [
+        "__import__('os').system('true')",
+        "open('/etc/passwd')",
+        "x + 1",
+        "2 ** 1000000",
+        "7 // 2",
+        "7 % 2",
+        "'a' * 3",
+        "True + 1",
+        "[1, 2]",
+        "(lambda: 1)()",
+        "~1",
+    ],
+)
+def test_eval_node_rejects_anything_else(expr):
+    with pytest.raises(ValueError):
+        evaluate(expr)
+
+
+@pytest.mark.parametrize(
+    "question, expected",
+    [
+        ("What is 30 + 38?", 68.0),
+        ("What is 7 × 8?", 56.0),
+        ("What is 84 ÷ 12?", 7.0),
+        ("What is 1,000 - 1?", 999.0),
+    ],
+)
+def test_try_compute_single_expression(question, expected):
+    assert app._try_compute(question) == expected
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "Sam has 3 apples and buys 4 more. How many now?",
+        "What is 1 + 2? And 3 + 4?",
+        "What is 5 / 0?",
+        "What is __import__('os').getpid() + 1?",
+    ],
+)
+def test_try_compute_gives_up(question):
+    assert app._try_compute(question) is None